@@ -0,0 +1,277 @@
+# Autocompletado del catálogo servido desde un índice de prefijos en memoria (por worker)
+# El mismo índice mantiene los trigramas de la búsqueda aproximada en SQLite
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+import asyncio
+import os
+import time
+import unicodedata
+import logging
+from sqlalchemy import func, select
+from . import models
+from .cache import cache_bus, CATALOG_TEXT_SLOT
+from .database import SessionLocal, engine
+from .fuzzy import TrigramIndex
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+
+def normalize(value: str) -> str:
+    """
+    Normaliza un texto para compararlo por prefijo: minúsculas, sin tildes
+    y con los espacios colapsados ("Añejo  Reserva" -> "anejo reserva")
+    """
+    if value.isascii():
+        return " ".join(value.lower().split())
+    decomposed = unicodedata.normalize("NFKD", value.casefold())
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(stripped.split())
+
+
+def index_keys(name: str, brand: str) -> set:
+    """
+    Claves indexadas para un licor: el nombre completo, la marca y el nombre
+    a partir de cada palabra, para que "dan" encuentre "Jack Daniel's"
+    """
+    words = normalize(name).split()
+    keys = {" ".join(words[i:]) for i in range(len(words))}
+    keys.add(normalize(brand))
+    keys.discard("")
+    return keys
+
+
+class PrefixIndex:
+    """
+    Índice de prefijos sobre el nombre y la marca de los licores.
+    Es un arreglo ordenado de pares (clave, id): una búsqueda es un bisect
+    más el recorrido de las claves que comparten el prefijo.
+    Las escrituras del propio worker lo actualizan de forma incremental;
+    las de otros workers se detectan con el slot CATALOG_TEXT_SLOT de cache_bus
+    y se aplican en segundo plano (como máximo una vez cada refresh_seconds)
+    leyendo solo las filas con updated_at reciente; mientras tanto se sigue
+    respondiendo con el índice actual.
+    Con fuzzy=True mantiene además un TrigramIndex sobre nombre y marca.
+    """
+    # Margen hacia atrás al leer cambios, para no perder filas cuyo
+    # updated_at se asignó antes que el de otra escritura pero se confirmó después
+    WATERMARK_OVERLAP = timedelta(seconds=60)
+    # Con más cambios que estos es más barato reconstruir el índice completo
+    MAX_INCREMENTAL_CHANGES = 1000
+
+    def __init__(self, refresh_seconds: float, fuzzy: bool = False):
+        self.refresh_seconds = refresh_seconds
+        self.fuzzy = fuzzy
+        self.entries: List[Tuple[str, int]] = []
+        self.trigrams = TrigramIndex()
+        self.liquors: Dict[int, Tuple[str, str]] = {}
+        self.built = False
+        self.generation: Optional[int] = None
+        self.watermark: Optional[datetime] = None
+        self.synced_at = 0.0
+        self.lock = asyncio.Lock()
+        self.refresh_task: Optional[asyncio.Task] = None
+
+    def add(self, liquor_id: int, name: str, brand: str):
+        """Agrega o reemplaza un licor en el índice"""
+        self.remove(liquor_id)
+        self.liquors[liquor_id] = (name, brand)
+        for key in index_keys(name, brand):
+            insort(self.entries, (key, liquor_id))
+        if self.fuzzy:
+            self.trigrams.add(liquor_id, normalize(f"{name} {brand}"))
+
+    def add_many(self, liquors: Iterable[Tuple[int, str, str]]):
+        """
+        Agrega o reemplaza varios licores (id, name, brand) reordenando el
+        arreglo una sola vez, en lugar de un insort por clave
+        """
+        liquors = sorted(liquors)
+        for liquor_id, _, _ in liquors:
+            self.remove(liquor_id)
+        for liquor_id, name, brand in liquors:
+            self.liquors[liquor_id] = (name, brand)
+            self.entries.extend((key, liquor_id) for key in index_keys(name, brand))
+        self.entries.sort()
+        if self.fuzzy:
+            self.trigrams.add_many(
+                (liquor_id, normalize(f"{name} {brand}")) for liquor_id, name, brand in liquors
+            )
+
+    def remove(self, liquor_id: int):
+        """Quita un licor del índice (si estaba)"""
+        current = self.liquors.pop(liquor_id, None)
+        if current is None:
+            return
+        for key in index_keys(*current):
+            position = bisect_left(self.entries, (key, liquor_id))
+            if position < len(self.entries) and self.entries[position] == (key, liquor_id):
+                del self.entries[position]
+        if self.fuzzy:
+            self.trigrams.remove(liquor_id, normalize("{} {}".format(*current)))
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[dict]:
+        """
+        Licores cuyo nombre, marca o alguna palabra del nombre empieza por prefix,
+        en orden alfabético de la clave encontrada y sin repetir licores
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        entries = self.entries
+        suggestions = []
+        seen = set()
+        position = bisect_left(entries, (prefix,))
+        while position < len(entries) and len(suggestions) < limit:
+            key, liquor_id = entries[position]
+            if not key.startswith(prefix):
+                break
+            if liquor_id not in seen:
+                seen.add(liquor_id)
+                name, brand = self.liquors[liquor_id]
+                suggestions.append({"id": liquor_id, "name": name, "brand": brand})
+            position += 1
+        return suggestions
+
+    def fuzzy_match(self, q: str, limit: int) -> List[int]:
+        """IDs de los licores cuyo nombre y marca más se parecen a q (ver TrigramIndex)"""
+        return self.trigrams.match(normalize(q), limit)
+
+    async def load(self):
+        """Construye el índice completo desde la tabla liquors (con self.lock adquirido)"""
+        # La generación se lee antes de consultar: si otro worker escribe
+        # durante la carga, la siguiente comprobación volverá a sincronizar
+        generation = cache_bus.generation(CATALOG_TEXT_SLOT)
+        started = time.perf_counter()
+        async with SessionLocal() as db:
+            rows = (await db.execute(
+                select(
+                    models.Liquor.id, models.Liquor.name,
+                    models.Liquor.brand, models.Liquor.updated_at
+                )
+            )).all()
+        liquors = {liquor_id: (name, brand) for liquor_id, name, brand, _ in rows}
+        # Ordenar cientos de miles de claves fuera del bucle de eventos
+        entries = await asyncio.to_thread(
+            lambda: sorted(
+                (key, liquor_id)
+                for liquor_id, (name, brand) in liquors.items()
+                for key in index_keys(name, brand)
+            )
+        )
+        trigrams = TrigramIndex()
+        if self.fuzzy:
+            await asyncio.to_thread(
+                trigrams.add_many,
+                (
+                    (liquor_id, normalize(f"{name} {brand}"))
+                    for liquor_id, (name, brand) in sorted(liquors.items())
+                )
+            )
+        self.entries, self.trigrams, self.liquors = entries, trigrams, liquors
+        self.generation = generation
+        self.watermark = max((row.updated_at for row in rows if row.updated_at), default=None)
+        self.synced_at = time.monotonic()
+        self.built = True
+        logger.info(
+            f"Índice de autocompletado construido: {len(liquors)} licores, "
+            f"{len(entries)} claves en {(time.perf_counter() - started) * 1000:.0f} ms"
+        )
+
+    async def sync(self):
+        """
+        Aplica los cambios hechos por otros workers (con self.lock adquirido)
+        Lee las filas con updated_at posterior a la última sincronización; si
+        después el índice tiene más licores que la tabla es que hubo borrados
+        y se reconstruye completo
+        """
+        if not self.built or self.watermark is None:
+            await self.load()
+            return
+        generation = cache_bus.generation(CATALOG_TEXT_SLOT)
+        async with SessionLocal() as db:
+            rows = (await db.execute(
+                select(
+                    models.Liquor.id, models.Liquor.name,
+                    models.Liquor.brand, models.Liquor.updated_at
+                )
+                .where(models.Liquor.updated_at >= self.watermark - self.WATERMARK_OVERLAP)
+            )).all()
+            total = await db.scalar(select(func.count(models.Liquor.id)))
+        changed = [row for row in rows if self.liquors.get(row.id) != (row.name, row.brand)]
+        if len(changed) > self.MAX_INCREMENTAL_CHANGES:
+            await self.load()
+            return
+        self.add_many((row.id, row.name, row.brand) for row in changed)
+        if len(self.liquors) != total:
+            await self.load()
+            return
+        self.generation = generation
+        self.watermark = max([self.watermark] + [row.updated_at for row in rows if row.updated_at])
+        self.synced_at = time.monotonic()
+        logger.info(f"Índice de autocompletado sincronizado: {len(changed)} licores actualizados")
+
+    async def ensure_ready(self):
+        """
+        Construye el índice si aún no existe y programa su sincronización
+        si otro worker cambió nombres o marcas desde la última carga
+        """
+        if not self.built:
+            async with self.lock:
+                if not self.built:
+                    await self.load()
+            return
+        stale = cache_bus.generation(CATALOG_TEXT_SLOT) != self.generation
+        due = time.monotonic() - self.synced_at >= self.refresh_seconds
+        running = self.refresh_task is not None and not self.refresh_task.done()
+        if stale and due and not running:
+            self.refresh_task = asyncio.create_task(self.refresh())
+
+    async def refresh(self):
+        """Sincronización en segundo plano; un error conserva el índice actual"""
+        try:
+            async with self.lock:
+                await self.sync()
+        except Exception as e:
+            logger.error(f"Error al sincronizar el índice de autocompletado: {str(e)}")
+
+    def record_write(self):
+        """
+        Publica en cache_bus un cambio de nombre o marca. Si el índice estaba
+        al día, sigue estándolo: la escritura ya se aplicó de forma incremental
+        """
+        in_sync = self.generation == cache_bus.generation(CATALOG_TEXT_SLOT)
+        cache_bus.bump(CATALOG_TEXT_SLOT)
+        if in_sync:
+            self.generation = cache_bus.generation(CATALOG_TEXT_SLOT)
+
+
+# AUTOCOMPLETE_REFRESH_SECONDS: intervalo mínimo entre sincronizaciones
+# provocadas por escrituras de otros workers
+# Los trigramas solo se mantienen en SQLite; PostgreSQL usa pg_trgm
+autocomplete_index = PrefixIndex(
+    refresh_seconds=float(os.getenv("AUTOCOMPLETE_REFRESH_SECONDS", "1")),
+    fuzzy=engine.dialect.name == "sqlite"
+)
+
+
+def index_liquor(liquor: models.Liquor):
+    """Agrega o actualiza un licor en el índice de autocompletado tras el commit"""
+    if autocomplete_index.built:
+        autocomplete_index.add(liquor.id, liquor.name, liquor.brand)
+    autocomplete_index.record_write()
+
+
+def index_liquors(liquors: Iterable[Tuple[int, str, str]]):
+    """Agrega varios licores (id, name, brand) al índice de autocompletado tras el commit"""
+    if autocomplete_index.built:
+        autocomplete_index.add_many(liquors)
+    autocomplete_index.record_write()
+
+
+def unindex_liquor(liquor_id: int):
+    """Quita un licor del índice de autocompletado tras el commit"""
+    if autocomplete_index.built:
+        autocomplete_index.remove(liquor_id)
+    autocomplete_index.record_write()
@@ -0,0 +1,189 @@
+# Caché en memoria (por worker) para las lecturas del catálogo de licores
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+import hashlib
+import mmap
+import os
+import tempfile
+import threading
+import time
+import logging
+from .database import DATABASE_URL
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+
+class GenerationBus:
+    """
+    Contadores de generación en memoria compartida (archivo mapeado con mmap)
+    para invalidar las cachés de todos los workers de la misma máquina.
+    Cada escritura incrementa el contador de su slot después del commit; cada
+    worker guarda junto a la entrada en caché la generación leída antes de ir
+    a la base de datos y la descarta si el contador cambió.
+    """
+    def __init__(self, path: str, slots: int = 4096):
+        self.path = path
+        self.slots = slots
+        size = slots * 8
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self.mmap = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self.counters = memoryview(self.mmap).cast("Q")
+
+    def generation(self, slot: int) -> int:
+        return self.counters[slot]
+
+    def bump(self, slot: int):
+        # Un incremento perdido por una carrera entre procesos es inofensivo:
+        # basta con que el valor cambie respecto al que guardó cada worker
+        self.counters[slot] = (self.counters[slot] + 1) % 2**64
+
+
+class TTLCache:
+    """
+    Caché LRU acotada con expiración por tiempo (TTL)
+    Guarda objetos ya serializables (esquemas Pydantic), nunca objetos ORM,
+    para que puedan compartirse entre sesiones de base de datos.
+    Si se indica version(key), las entradas cuya versión cambió se descartan.
+    """
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        version: Optional[Callable[[Hashable], int]] = None
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = version or (lambda key: 0)
+        self.lock = threading.Lock()
+        self.data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Retorna el valor en caché o None si no existe, expiró o fue invalidado"""
+        version = self.version(key)
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, entry_version, value = entry
+            if entry_version != version:
+                del self.data[key]
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            if expires_at <= time.monotonic():
+                del self.data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, version: Optional[int] = None):
+        """
+        Guarda un valor, desalojando el menos usado si la caché está llena
+        version debe leerse antes de consultar la base de datos
+        """
+        if self.maxsize <= 0:
+            return
+        if version is None:
+            version = self.version(key)
+        with self.lock:
+            self.data[key] = (time.monotonic() + self.ttl, version, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+                self.evictions += 1
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Lectura a través de la caché: si no hay valor se obtiene con loader()
+        Los resultados None no se guardan
+        """
+        version = self.version(key)
+        value = self.get(key)
+        if value is None:
+            value = await loader()
+            if value is not None:
+                self.set(key, value, version)
+        return value
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]):
+        """Elimina las entradas cuya clave cumple el predicado"""
+        with self.lock:
+            keys = [key for key in self.data if predicate(key)]
+            for key in keys:
+                del self.data[key]
+            self.invalidations += len(keys)
+
+    def stats(self) -> dict:
+        """Retorna los contadores de la caché"""
+        with self.lock:
+            return {
+                "size": len(self.data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+# Bus de invalidación compartido por los workers que usan la misma base de datos
+# El slot 0 corresponde a las páginas del listado, el slot 1 a los cambios de
+# nombre o marca (índice de autocompletado) y el resto a los licores por ID
+CACHE_BUS_PATH = os.getenv(
+    "LIQUOR_CACHE_BUS_PATH",
+    os.path.join(
+        tempfile.gettempdir(),
+        f"liquors_cache_{hashlib.sha1(DATABASE_URL.encode()).hexdigest()[:12]}.gen"
+    )
+)
+cache_bus = GenerationBus(CACHE_BUS_PATH)
+LIST_SLOT = 0
+CATALOG_TEXT_SLOT = 1
+
+def cache_slot(key: Hashable) -> int:
+    """Slot del bus de invalidación para una clave de la caché"""
+    if key[0] == "liquor":
+        return 2 + key[1] % (cache_bus.slots - 2)
+    return LIST_SLOT
+
+# Caché del catálogo: licores por ID ("liquor", id), páginas del listado ("list", ...)
+# y conteos por faceta ("facets", ...)
+# LIQUOR_CACHE_SIZE=0 desactiva la caché
+liquor_cache = TTLCache(
+    maxsize=int(os.getenv("LIQUOR_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("LIQUOR_CACHE_TTL", "30")),
+    version=lambda key: cache_bus.generation(cache_slot(key))
+)
+
+
+def invalidate_liquors(*liquor_ids: int):
+    """
+    Invalida los licores indicados, todas las páginas del listado y las
+    facetas, ya que cualquier escritura puede cambiar su contenido u orden.
+    La invalidación llega a los demás workers a través de cache_bus.
+    """
+    ids = set(liquor_ids)
+    for liquor_id in ids:
+        cache_bus.bump(cache_slot(("liquor", liquor_id)))
+    cache_bus.bump(LIST_SLOT)
+    liquor_cache.invalidate(
+        lambda key: key[0] != "liquor" or key[1] in ids
+    )
+    logger.info(f"Caché de licores invalidada para: {sorted(ids)}")
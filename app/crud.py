@@ -1,9 +1,15 @@
-from sqlalchemy.orm import Session
-from . import models, schemas
-from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from . import facets, models, schemas, search
+from .cache import liquor_cache, invalidate_liquors
+from .autocomplete import autocomplete_index, index_liquor, index_liquors, unindex_liquor
+from .fuzzy import FUZZY_THRESHOLD
+from typing import Dict, List, Optional, Sequence, Tuple
 from datetime import datetime
 import logging
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import Boolean, bindparam, case, func, insert, literal_column, or_, select, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
 #############################################
 # OPERACIONES CRUD PARA LICORES
@@ -13,22 +19,183 @@ from sqlalchemy.exc import SQLAlchemyError
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def get_liquors(db: Session, skip: int = 0, limit: int = 100) -> List[models.Liquor]:
-    """Obtiene lista de licores con paginación"""
+# Columnas por las que se puede ordenar el listado de licores
+# Cada una tiene índices compuestos (columna, id) y (category, columna, id)
+LIQUOR_SORT_COLUMNS = {
+    "id": models.Liquor.id,
+    "price": models.Liquor.price,
+    "name": models.Liquor.name,
+    "stock": models.Liquor.stock,
+    "updated_at": models.Liquor.updated_at,
+}
+
+# Columnas de schemas.Liquor, con los mismos nombres y en el mismo orden
+# Los listados y la exportación las leen sin construir objetos ORM
+LIQUOR_COLUMNS = [models.Liquor.id] + [
+    models.Liquor.__table__.c[name] for name in schemas.Liquor.model_fields if name != "id"
+]
+
+def selected_columns(columns: list, fields: Optional[Sequence[str]]) -> list:
+    """Columnas de una selección de campos (todas si es None), en el mismo orden"""
+    if fields is None:
+        return columns
+    return [column for column in columns if column.name in fields]
+
+# Columnas con filtro por rango (min_<columna>/max_<columna>)
+# Cada una tiene un índice compuesto (columna, id)
+LIQUOR_RANGE_COLUMNS = {
+    "price": models.Liquor.price,
+    "alcohol_content": models.Liquor.alcohol_content,
+    "volume_ml": models.Liquor.volume_ml,
+    "stock": models.Liquor.stock,
+}
+
+def range_conditions(ranges: Optional[schemas.LiquorRanges]) -> dict:
+    """
+    Condiciones WHERE de los filtros por rango, por nombre de columna
+    Los límites son inclusivos: min_price=20 incluye los licores de precio 20
+    """
+    conditions = {}
+    if ranges is None:
+        return conditions
+    for name, column in LIQUOR_RANGE_COLUMNS.items():
+        low, high = getattr(ranges, f"min_{name}"), getattr(ranges, f"max_{name}")
+        if low is not None and high is not None:
+            conditions[name] = column.between(low, high)
+        elif low is not None:
+            conditions[name] = column >= low
+        elif high is not None:
+            conditions[name] = column <= high
+    return conditions
+
+# Clave natural de los licores (índice único ix_liquors_brand_name_volume_ml)
+LIQUOR_NATURAL_KEY = ("brand", "name", "volume_ml")
+LIQUOR_NATURAL_KEY_INDEX = "ix_liquors_brand_name_volume_ml"
+
+def is_duplicate_liquor(error: IntegrityError) -> bool:
+    """
+    Si un IntegrityError viene del índice único de la clave natural y no de
+    otra restricción (p. ej. NOT NULL). PostgreSQL nombra el índice en el
+    mensaje; SQLite nombra sus columnas
+    """
+    message = str(error.orig)
+    columns = ", ".join(f"liquors.{name}" for name in LIQUOR_NATURAL_KEY)
+    return LIQUOR_NATURAL_KEY_INDEX in message or f"UNIQUE constraint failed: {columns}" in message
+
+# Columnas que el catálogo de un proveedor puede cambiar en licores existentes
+# El stock, la disponibilidad y el stock mínimo los gestiona la tienda y solo
+# se toman del catálogo al crear el licor
+UPSERT_UPDATE_COLUMNS = ("description", "category", "price", "alcohol_content", "supplier")
+
+def parse_cursor_values(values: list, columns: list) -> list:
+    """
+    Convierte los valores de un cursor al tipo de las columnas de ordenamiento
+    Lanza ValueError si el cursor no corresponde al ordenamiento solicitado
+    """
+    if len(values) != len(columns):
+        raise ValueError("Cursor inválido para el ordenamiento solicitado")
+    parsed = []
+    for value, column in zip(values, columns):
+        python_type = column.type.python_type
+        try:
+            if python_type is datetime:
+                parsed.append(datetime.fromisoformat(value))
+            else:
+                parsed.append(python_type(value))
+        except (TypeError, ValueError):
+            raise ValueError("Cursor inválido para el ordenamiento solicitado")
+    return parsed
+
+async def get_liquors(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[list] = None,
+    category: Optional[models.LiquorCategory] = None,
+    sort_by: str = "id",
+    descending: bool = False,
+    ranges: Optional[schemas.LiquorRanges] = None,
+    fields: Optional[Tuple[str, ...]] = None
+) -> List[schemas.Liquor]:
+    """
+    Obtiene lista de licores con paginación, filtros por categoría y por
+    rango (precio, graduación, volumen y stock) y ordenamiento
+    Si se indica after (valores del cursor: [id] o [sort_key, id]) se usa
+    paginación por cursor (keyset): se retornan los licores posteriores a esa
+    clave, sin recorrer las filas de las páginas anteriores
+    Lee columnas (no objetos ORM) y retorna esquemas validados en una sola
+    llamada a schemas.list_adapter; con fields solo lee esas columnas
+    """
     try:
-        logger.info(f"Obteniendo licores (skip={skip}, limit={limit})")
-        liquors = db.query(models.Liquor).offset(skip).limit(limit).all()
+        logger.info(
+            f"Obteniendo licores (skip={skip}, limit={limit}, after={after}, "
+            f"category={category}, sort_by={sort_by}, descending={descending}, ranges={ranges}, fields={fields})"
+        )
+        # Ordenamos siempre por (columna, id) para que el orden sea total
+        key = [models.Liquor.id]
+        if sort_by != "id":
+            key.insert(0, LIQUOR_SORT_COLUMNS[sort_by])
+        query = select(*selected_columns(LIQUOR_COLUMNS, fields))
+        if category is not None:
+            query = query.where(models.Liquor.category == category)
+        query = query.where(*range_conditions(ranges).values())
+        query = query.order_by(*(column.desc() if descending else column for column in key))
+        if after is not None:
+            values = parse_cursor_values(after, key)
+            row, bound = tuple_(*key), tuple_(*values)
+            query = query.where(row < bound if descending else row > bound)
+        else:
+            query = query.offset(skip)
+        rows = (await db.execute(query.limit(limit))).all()
+        liquors = schemas.list_adapter(schemas.Liquor, fields).validate_python(
+            [dict(row._mapping) for row in rows]
+        )
         logger.info(f"Se encontraron {len(liquors)} licores")
         return liquors
     except SQLAlchemyError as e:
         logger.error(f"Error al obtener licores: {str(e)}")
         raise
 
-def get_liquor(db: Session, liquor_id: int) -> Optional[models.Liquor]:
+def liquor_export_statement(
+    category: Optional[models.LiquorCategory] = None,
+    ranges: Optional[schemas.LiquorRanges] = None,
+    fields: Optional[Tuple[str, ...]] = None
+):
+    """
+    Consulta Core (sin objetos ORM) de la exportación del catálogo, en orden de ID
+    Acepta los mismos filtros por categoría y por rango y la misma selección
+    de campos que get_liquors
+    """
+    query = select(*selected_columns(LIQUOR_COLUMNS, fields))
+    if category is not None:
+        query = query.where(models.Liquor.category == category)
+    return query.where(*range_conditions(ranges).values()).order_by(models.Liquor.id)
+
+async def get_catalog_version(db: AsyncSession) -> Tuple[Optional[datetime], int]:
+    """
+    Versión del catálogo para el ETag del listado: el updated_at más reciente
+    (extremo del índice ix_liquors_updated_at_id) y el número de licores.
+    Toda escritura de un licor, incluido el stock que descuenta una venta,
+    cambia updated_at; una baja cambia el conteo
+    """
+    row = (await db.execute(select(
+        select(func.max(models.Liquor.updated_at)).scalar_subquery(),
+        select(func.count()).select_from(models.Liquor).scalar_subquery()
+    ))).one()
+    return row[0], row[1]
+
+async def get_catalog_version_cached(db: AsyncSession) -> Tuple[Optional[datetime], int]:
+    """
+    Versión con caché de get_catalog_version; comparte el slot de las páginas
+    del listado, así que cualquier escritura del catálogo la invalida
+    """
+    return await liquor_cache.get_or_load(("version",), lambda: get_catalog_version(db))
+
+async def get_liquor(db: AsyncSession, liquor_id: int) -> Optional[models.Liquor]:
     """Obtiene un licor por su ID"""
     try:
         logger.info(f"Buscando licor con ID: {liquor_id}")
-        liquor = db.query(models.Liquor).filter(models.Liquor.id == liquor_id).first()
+        liquor = await db.get(models.Liquor, liquor_id)
         if liquor:
             logger.info(f"Licor encontrado: {liquor.name}")
         else:
@@ -38,11 +205,116 @@ def get_liquor(db: Session, liquor_id: int) -> Optional[models.Liquor]:
         logger.error(f"Error al buscar licor: {str(e)}")
         raise
 
-def get_liquors_by_category(db: Session, category: models.LiquorCategory) -> List[models.Liquor]:
-    """Obtiene licores por categoría"""
-    return db.query(models.Liquor).filter(models.Liquor.category == category).all()
+async def get_liquors_cached(db: AsyncSession, **filters) -> List[schemas.Liquor]:
+    """
+    Versión con caché de get_liquors (mismos filtros); retorna esquemas, no objetos ORM
+    """
+    key = ("list",) + tuple(
+        (name, tuple(value) if isinstance(value, list) else value)
+        for name, value in sorted(filters.items())
+    )
+    return await liquor_cache.get_or_load(key, lambda: get_liquors(db, **filters))
+
+async def get_liquor_cached(db: AsyncSession, liquor_id: int) -> Optional[schemas.Liquor]:
+    """
+    Versión con caché de get_liquor; retorna el esquema, no el objeto ORM
+    """
+    async def load():
+        liquor = await get_liquor(db, liquor_id)
+        return schemas.Liquor.model_validate(liquor) if liquor else None
+    return await liquor_cache.get_or_load(("liquor", liquor_id), load)
+
+async def search_liquors(db: AsyncSession, q: str, limit: int = 20) -> List[models.Liquor]:
+    """
+    Búsqueda de texto completo en nombre, marca, descripción y proveedor,
+    ordenada por relevancia (FTS5 en SQLite, tsvector en PostgreSQL)
+    """
+    terms = search.search_terms(q)
+    if not terms:
+        return []
+    logger.info(f"Buscando licores: {terms}")
+    query = search.search_statement(db.bind.dialect.name, terms, limit)
+    return (await db.scalars(query)).all()
+
+async def fuzzy_search_liquors(db: AsyncSession, q: str, limit: int = 20) -> List[models.Liquor]:
+    """
+    Búsqueda aproximada por nombre y marca, tolerante a errores de escritura
+    ("jonnie walker" encuentra "Johnnie Walker"), ordenada por similitud
+    PostgreSQL: pg_trgm; SQLite: índice de trigramas en memoria del worker
+    """
+    dialect = db.bind.dialect.name
+    logger.info(f"Búsqueda aproximada de licores: {q}")
+    if dialect == "postgresql":
+        await db.execute(select(func.set_config(
+            "pg_trgm.word_similarity_threshold", str(FUZZY_THRESHOLD), True
+        )))
+        return (await db.scalars(search.fuzzy_statement(q, limit))).all()
+    if dialect != "sqlite":
+        raise ValueError(f"Búsqueda no soportada para la base de datos: {dialect}")
+    await autocomplete_index.ensure_ready()
+    ids = autocomplete_index.fuzzy_match(q, limit)
+    if not ids:
+        return []
+    liquors = (await db.scalars(select(models.Liquor).where(models.Liquor.id.in_(ids)))).all()
+    rank = {liquor_id: position for position, liquor_id in enumerate(ids)}
+    return sorted(liquors, key=lambda liquor: rank[liquor.id])
+
+async def get_facets(
+    db: AsyncSession,
+    q: Optional[str] = None,
+    category: Optional[models.LiquorCategory] = None,
+    brand: Optional[str] = None,
+    supplier: Optional[str] = None,
+    ranges: Optional[schemas.LiquorRanges] = None,
+    facet_limit: int = 20
+) -> dict:
+    """
+    Conteos por categoría, marca, proveedor y rangos de precio y graduación
+    para un conjunto de filtros, en una sola consulta (ver facets.facets_statement)
+    """
+    try:
+        logger.info(
+            f"Obteniendo facetas (q={q}, category={category}, brand={brand}, "
+            f"supplier={supplier}, ranges={ranges})"
+        )
+        # Los rangos de precio y graduación se llaman igual que su faceta:
+        # la rama de cada una ignora su propio filtro
+        conditions = range_conditions(ranges)
+        if q:
+            terms = search.search_terms(q)
+            if terms:
+                conditions["q"] = search.search_condition(db.bind.dialect.name, terms)
+        if category is not None:
+            conditions["category"] = models.Liquor.category == category
+        if brand is not None:
+            conditions["brand"] = models.Liquor.brand == brand
+        if supplier is not None:
+            conditions["supplier"] = models.Liquor.supplier == supplier
+        rows = (await db.execute(facets.facets_statement(conditions))).all()
+        return facets.group_facets(rows, facet_limit)
+    except SQLAlchemyError as e:
+        logger.error(f"Error al obtener facetas: {str(e)}")
+        raise
+
+async def get_facets_cached(db: AsyncSession, **filters) -> schemas.LiquorFacets:
+    """
+    Versión con caché de get_facets; se invalida con cualquier escritura del catálogo
+    """
+    key = ("facets",) + tuple(sorted(filters.items()))
+    async def load():
+        return schemas.LiquorFacets.model_validate(await get_facets(db, **filters))
+    return await liquor_cache.get_or_load(key, load)
+
+def liquor_values(liquor: schemas.LiquorBase) -> dict:
+    """
+    Columnas del modelo a partir del esquema de la API
+    La API usa los valores de la categoría ("whiskey") y la columna el Enum del modelo
+    """
+    values = liquor.dict()
+    values["category"] = models.LiquorCategory(liquor.category.value)
+    return values
 
-def create_liquor(db: Session, liquor: schemas.LiquorCreate) -> models.Liquor:
+async def create_liquor(db: AsyncSession, liquor: schemas.LiquorCreate) -> models.Liquor:
     """
     Crea un nuevo licor en la base de datos
     Args:
@@ -53,20 +325,162 @@ def create_liquor(db: Session, liquor: schemas.LiquorCreate) -> models.Liquor:
     """
     try:
         logger.info(f"Creando nuevo licor: {liquor.dict()}")
-        db_liquor = models.Liquor(**liquor.dict())
+        db_liquor = models.Liquor(**liquor_values(liquor))
         db.add(db_liquor)
-        db.flush()  # Flush para obtener el ID antes del commit
+        await db.flush()  # Flush para obtener el ID antes del commit
         logger.info(f"Licor creado con ID: {db_liquor.id}")
-        db.commit()
+        await db.commit()
         logger.info("Transacción completada exitosamente")
-        db.refresh(db_liquor)
+        invalidate_liquors(db_liquor.id)
+        index_liquor(db_liquor)
+        await db.refresh(db_liquor)
         return db_liquor
     except SQLAlchemyError as e:
         logger.error(f"Error al crear licor: {str(e)}")
-        db.rollback()
+        await db.rollback()
         raise
 
-def update_liquor(db: Session, liquor_id: int, liquor_data: schemas.LiquorUpdate) -> Optional[models.Liquor]:
+async def create_liquors_bulk(
+    db: AsyncSession,
+    liquors: List[schemas.LiquorCreate],
+    batch_size: int = 1000
+) -> List[int]:
+    """
+    Crea varios licores en una sola transacción
+    Cada lote es un INSERT de varias filas con RETURNING (executemany de
+    SQLAlchemy), en lugar de add/flush/commit/refresh por licor
+    Args:
+        db: Sesión de la base de datos
+        liquors: Licores ya validados
+        batch_size: Filas por lote
+    Returns:
+        Los IDs creados, en el mismo orden que liquors
+    """
+    try:
+        logger.info(f"Creando {len(liquors)} licores en lotes de {batch_size}")
+        # SQLAlchemy no puede garantizar el orden de RETURNING en SQLite sin
+        # insertar fila por fila; allí los rowid se asignan en el orden de
+        # VALUES (máximo + 1, con un solo escritor), así que basta ordenarlos
+        ordered = db.bind.dialect.name != "sqlite"
+        statement = insert(models.Liquor).returning(
+            models.Liquor.id, sort_by_parameter_order=ordered
+        )
+        ids = []
+        for start in range(0, len(liquors), batch_size):
+            batch = [liquor_values(liquor) for liquor in liquors[start:start + batch_size]]
+            batch_ids = (await db.scalars(statement, batch)).all()
+            ids.extend(batch_ids if ordered else sorted(batch_ids))
+        await db.commit()
+        logger.info(f"Licores creados: {len(ids)}")
+        invalidate_liquors()
+        index_liquors(
+            (liquor_id, liquor.name, liquor.brand) for liquor_id, liquor in zip(ids, liquors)
+        )
+        return ids
+    except SQLAlchemyError as e:
+        logger.error(f"Error al crear licores en lote: {str(e)}")
+        await db.rollback()
+        raise
+
+async def existing_liquor_keys(
+    db: AsyncSession, keys: Sequence[tuple], batch_size: int = 1000
+) -> set:
+    """
+    Claves naturales (marca, nombre, volumen) de keys que ya existen en el
+    catálogo, con un IN de tuplas por lote sobre el índice único
+    """
+    columns = [models.Liquor.__table__.c[name] for name in LIQUOR_NATURAL_KEY]
+    existing = set()
+    for start in range(0, len(keys), batch_size):
+        rows = await db.execute(
+            select(*columns).where(tuple_(*columns).in_(keys[start:start + batch_size]))
+        )
+        existing.update(tuple(row) for row in rows)
+    return existing
+
+async def upsert_liquors(
+    db: AsyncSession,
+    liquors: List[schemas.LiquorCreate],
+    batch_size: int = 1000
+) -> dict:
+    """
+    Aplica el catálogo de un proveedor con INSERT ... ON CONFLICT DO UPDATE
+    sobre la clave natural (marca, nombre, volumen), en una sola transacción
+    Solo se actualizan las filas en las que alguna columna de
+    UPSERT_UPDATE_COLUMNS cambió; las demás no se tocan
+    Args:
+        db: Sesión de la base de datos
+        liquors: Licores ya validados, sin claves naturales repetidas
+        batch_size: Filas por lote
+    Returns:
+        Conteos {"inserted", "updated", "unchanged"}
+    """
+    dialect = db.bind.dialect.name
+    if dialect == "postgresql":
+        dialect_insert = postgresql.insert
+    elif dialect == "sqlite":
+        dialect_insert = sqlite.insert
+    else:
+        raise ValueError(f"Actualización masiva no soportada para la base de datos: {dialect}")
+    try:
+        logger.info(f"Aplicando catálogo de {len(liquors)} licores en lotes de {batch_size}")
+        table = models.Liquor.__table__
+        statement = dialect_insert(table)
+        returning = [table.c.id, *(table.c[name] for name in LIQUOR_NATURAL_KEY)]
+        if dialect == "postgresql":
+            # xmax = 0 solo en las filas que creó este INSERT; las actualizadas
+            # conservan el xmax de su versión anterior
+            returning.append(literal_column("xmax = 0", Boolean).label("inserted"))
+        now = datetime.utcnow()
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c[name] for name in LIQUOR_NATURAL_KEY],
+            set_={
+                **{name: statement.excluded[name] for name in UPSERT_UPDATE_COLUMNS},
+                "updated_at": statement.excluded.updated_at,
+            },
+            where=or_(*(
+                table.c[name].is_distinct_from(statement.excluded[name])
+                for name in UPSERT_UPDATE_COLUMNS
+            ))
+        ).returning(*returning)
+        inserted, updated = [], []
+        for start in range(0, len(liquors), batch_size):
+            batch = [
+                {**liquor_values(liquor), "created_at": now, "updated_at": now}
+                for liquor in liquors[start:start + batch_size]
+            ]
+            if dialect == "sqlite":
+                # SQLite no indica si la fila se insertó: se comparan las claves
+                # que ya existían antes del lote, en la misma transacción
+                existing = await existing_liquor_keys(
+                    db, [tuple(values[name] for name in LIQUOR_NATURAL_KEY) for values in batch], batch_size
+                )
+            for row in (await db.execute(statement, batch)).all():
+                if dialect == "postgresql":
+                    is_new = row.inserted
+                else:
+                    is_new = tuple(row[1:1 + len(LIQUOR_NATURAL_KEY)]) not in existing
+                (inserted if is_new else updated).append(row)
+        await db.commit()
+        counts = {
+            "inserted": len(inserted),
+            "updated": len(updated),
+            "unchanged": len(liquors) - len(inserted) - len(updated),
+        }
+        logger.info(f"Catálogo aplicado: {counts}")
+        if inserted or updated:
+            invalidate_liquors(*(row.id for row in updated))
+        if inserted:
+            # La clave natural incluye nombre y marca: solo las filas nuevas
+            # cambian el índice de autocompletado
+            index_liquors((row.id, row.name, row.brand) for row in inserted)
+        return counts
+    except SQLAlchemyError as e:
+        logger.error(f"Error al aplicar el catálogo: {str(e)}")
+        await db.rollback()
+        raise
+
+async def update_liquor(db: AsyncSession, liquor_id: int, liquor_data: schemas.LiquorUpdate) -> Optional[models.Liquor]:
     """
     Actualiza un licor existente
     Args:
@@ -78,52 +492,112 @@ def update_liquor(db: Session, liquor_id: int, liquor_data: schemas.LiquorUpdate
     """
     try:
         logger.info(f"Actualizando licor ID: {liquor_id}")
-        db_liquor = get_liquor(db, liquor_id)
+        db_liquor = await get_liquor(db, liquor_id)
         if db_liquor:
             update_data = liquor_data.dict(exclude_unset=True)
+            # Ningún campo de schemas.Liquor admite nulo: un null explícito no borra el valor
+            nulls = sorted(key for key, value in update_data.items() if value is None)
+            if nulls:
+                raise ValueError(f"Los campos no pueden ser nulos: {', '.join(nulls)}")
+            if update_data.get("category") is not None:
+                update_data["category"] = models.LiquorCategory(update_data["category"].value)
             for key, value in update_data.items():
                 setattr(db_liquor, key, value)
             db_liquor.updated_at = datetime.utcnow()
-            db.flush()
+            await db.flush()
             logger.info(f"Licor actualizado: {db_liquor.name}")
-            db.commit()
-            db.refresh(db_liquor)
+            await db.commit()
+            invalidate_liquors(liquor_id)
+            if "name" in update_data or "brand" in update_data:
+                index_liquor(db_liquor)
+            await db.refresh(db_liquor)
         return db_liquor
     except SQLAlchemyError as e:
         logger.error(f"Error al actualizar licor: {str(e)}")
-        db.rollback()
+        await db.rollback()
         raise
 
-def delete_liquor(db: Session, liquor_id: int) -> Optional[models.Liquor]:
+async def delete_liquor(db: AsyncSession, liquor_id: int) -> Optional[models.Liquor]:
     """Elimina un licor de la base de datos"""
     try:
         logger.info(f"Eliminando licor ID: {liquor_id}")
-        db_liquor = get_liquor(db, liquor_id)
+        db_liquor = await get_liquor(db, liquor_id)
         if db_liquor:
-            db.delete(db_liquor)
-            db.commit()
+            await db.delete(db_liquor)
+            await db.commit()
+            invalidate_liquors(liquor_id)
+            unindex_liquor(liquor_id)
             logger.info(f"Licor eliminado: {db_liquor.name}")
         return db_liquor
     except SQLAlchemyError as e:
         logger.error(f"Error al eliminar licor: {str(e)}")
-        db.rollback()
+        await db.rollback()
         raise
 
 #############################################
 # OPERACIONES CRUD PARA VENTAS
 #############################################
 
-def create_sale(db: Session, sale: schemas.SaleCreate) -> models.Sale:
+async def reserve_stock(db: AsyncSession, quantities: Dict[int, int]):
+    """
+    Pasos 1 y 2 de create_sale: carga los licores vendidos y descuenta sus
+    cantidades (quantities: {liquor_id: cantidad}, no vacío)
+    Lanza ValueError si algún licor no existe o no tiene stock suficiente
+    """
+    # 1. Cargamos todos los licores referenciados con un único IN (...)
+    stocks = dict((await db.execute(
+        select(models.Liquor.id, models.Liquor.stock)
+        .where(models.Liquor.id.in_(quantities))
+        .with_for_update()
+    )).all())
+    missing = sorted(set(quantities) - set(stocks))
+    if missing:
+        raise ValueError(f"Licores no encontrados: {missing}")
+    insufficient = sorted(
+        liquor_id for liquor_id, quantity in quantities.items()
+        if (stocks[liquor_id] or 0) < quantity
+    )
+    if insufficient:
+        raise ValueError(f"Stock insuficiente para los licores: {insufficient}")
+
+    # 2. Descontamos el inventario en una sola sentencia; la condición
+    # stock >= cantidad evita dejar stock negativo si otro worker vendió antes
+    quantity = case(quantities, value=models.Liquor.id)
+    result = await db.execute(
+        update(models.Liquor)
+        .where(models.Liquor.id.in_(quantities), models.Liquor.stock >= quantity)
+        .values(
+            stock=models.Liquor.stock - quantity,
+            is_available=(models.Liquor.stock - quantity) > 0
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != len(quantities):
+        raise ValueError("Stock insuficiente: el inventario cambió durante la venta")
+    logger.info(f"Stock actualizado para licores: {sorted(quantities)}")
+
+async def create_sale(db: AsyncSession, sale: schemas.SaleCreate) -> models.Sale:
     """
     Crea una nueva venta y actualiza el inventario
     Este proceso incluye:
-    1. Crear el registro de la venta
-    2. Crear las líneas de venta
-    3. Actualizar el inventario de los productos vendidos
+    1. Cargar en una sola consulta los licores vendidos (bloqueando sus filas)
+    2. Descontar el inventario con un UPDATE condicional (stock >= cantidad)
+    3. Crear el registro de la venta y sus líneas
+    El número de consultas no depende de la cantidad de líneas de la venta.
+    Lanza ValueError si algún licor no existe o no tiene stock suficiente.
     """
     try:
         logger.info("Iniciando creación de venta")
-        # 1. Crear la venta principal
+        # Agrupamos las cantidades por licor (un licor puede repetirse en varias líneas)
+        quantities = {}
+        for line in sale.sale_lines:
+            quantities[line.liquor_id] = quantities.get(line.liquor_id, 0) + line.quantity
+
+        # Una venta sin líneas no toca el inventario (un CASE sin ramas no es SQL válido)
+        if quantities:
+            await reserve_stock(db, quantities)
+
+        # 3. Crear la venta principal y sus líneas
         db_sale = models.Sale(
             customer_name=sale.customer_name,
             customer_id=sale.customer_id,
@@ -131,86 +605,289 @@ def create_sale(db: Session, sale: schemas.SaleCreate) -> models.Sale:
             payment_method=sale.payment_method
         )
         db.add(db_sale)
-        db.flush()  # Obtenemos el ID de la venta antes de crear las líneas
+        await db.flush()  # Obtenemos el ID de la venta antes de crear las líneas
         logger.info(f"Venta creada con ID: {db_sale.id}")
 
-        # 2. Crear las líneas de venta y 3. Actualizar inventario
-        for line in sale.sale_lines:
-            # Creamos la línea de venta
-            db_sale_line = models.SaleLine(
-                sale_id=db_sale.id,
-                liquor_id=line.liquor_id,
-                quantity=line.quantity,
-                unit_price=line.unit_price,
-                subtotal=line.subtotal
+        # Insertamos todas las líneas con un solo executemany
+        if sale.sale_lines:
+            await db.execute(
+                insert(models.SaleLine),
+                [
+                    {
+                        "sale_id": db_sale.id,
+                        "liquor_id": line.liquor_id,
+                        "quantity": line.quantity,
+                        "unit_price": line.unit_price,
+                        "subtotal": line.subtotal
+                    }
+                    for line in sale.sale_lines
+                ]
             )
-            db.add(db_sale_line)
-
-            # Actualizamos el inventario del licor
-            liquor = get_liquor(db, line.liquor_id)
-            if liquor:
-                liquor.stock -= line.quantity
-                liquor.is_available = liquor.stock > 0
-                logger.info(f"Stock actualizado para licor {liquor.id}: {liquor.stock}")
 
         # Confirmamos todos los cambios en una sola transacción
-        db.commit()
+        await db.commit()
         logger.info("Venta completada exitosamente")
-        db.refresh(db_sale)
-        return db_sale
-    except SQLAlchemyError as e:
+        if quantities:
+            invalidate_liquors(*quantities)
+        return await get_sale(db, db_sale.id)
+    except (SQLAlchemyError, ValueError) as e:
         logger.error(f"Error al crear venta: {str(e)}")
-        db.rollback()
+        await db.rollback()
         raise
 
-def get_sale(db: Session, sale_id: int) -> Optional[models.Sale]:
+# Columnas de sale_lines en el orden del COPY de PostgreSQL
+SALE_LINE_COPY_COLUMNS = ("sale_id", "liquor_id", "quantity", "unit_price", "subtotal")
+
+async def imported_sale_digests(db: AsyncSession, digests: Sequence[str]) -> set:
+    """Huellas de digests que ya tienen una venta importada (ver models.ImportedSale)"""
+    return set(await db.scalars(
+        select(models.ImportedSale.digest).where(models.ImportedSale.digest.in_(digests))
+    ))
+
+async def insert_sales_batch(
+    db: AsyncSession, sales: List[schemas.SaleImport], digests: Sequence[str]
+) -> int:
+    """
+    Inserta un lote de ventas históricas, sus líneas y sus huellas (digests,
+    en el mismo orden que sales) sin confirmar la transacción ni tocar el
+    inventario (ver apply_sold_quantities)
+    Las ventas van en un INSERT de varias filas con RETURNING para conocer sus
+    IDs; las líneas, en un INSERT de varias filas (COPY en PostgreSQL)
+    Returns:
+        Número de líneas insertadas
+    """
+    dialect = db.bind.dialect.name
+    ordered = dialect != "sqlite"
+    # Igual que en create_liquors_bulk: en SQLite los IDs siguen el orden de VALUES
+    ids = (await db.scalars(
+        insert(models.Sale).returning(models.Sale.id, sort_by_parameter_order=ordered),
+        [sale.model_dump(exclude={"sale_lines"}) for sale in sales]
+    )).all()
+    if not ordered:
+        ids = sorted(ids)
+    await db.execute(
+        insert(models.ImportedSale),
+        [{"digest": digest, "sale_id": sale_id} for digest, sale_id in zip(digests, ids)]
+    )
+    lines = [
+        (sale_id, line.liquor_id, line.quantity, line.unit_price, line.subtotal)
+        for sale_id, sale in zip(ids, sales)
+        for line in sale.sale_lines
+    ]
+    if not lines:
+        return 0
+    if dialect == "postgresql":
+        # COPY sobre la misma conexión (y transacción) de la sesión
+        connection = await (await db.connection()).get_raw_connection()
+        await connection.driver_connection.copy_records_to_table(
+            models.SaleLine.__tablename__, records=lines, columns=SALE_LINE_COPY_COLUMNS
+        )
+    else:
+        await db.execute(
+            insert(models.SaleLine),
+            [dict(zip(SALE_LINE_COPY_COLUMNS, line)) for line in lines]
+        )
+    return len(lines)
+
+async def apply_sold_quantities(
+    db: AsyncSession,
+    quantities: dict,
+    batch_size: int = 1000
+) -> int:
+    """
+    Descuenta del inventario las cantidades vendidas, un UPDATE por licor
+    (executemany por lotes) en lugar de uno por línea de venta, sin confirmar
+    Las ventas históricas ya ocurrieron: si el stock no alcanza queda en 0
+    Args:
+        quantities: Cantidad total vendida por ID de licor
+    Returns:
+        Número de licores actualizados
+    """
+    table = models.Liquor.__table__
+    remaining = table.c.stock - bindparam("sold")
+    statement = (
+        update(table)
+        .where(table.c.id == bindparam("liquor_id"))
+        .values(
+            stock=case((remaining > 0, remaining), else_=0),
+            is_available=remaining > 0
+        )
+    )
+    items = sorted(quantities.items())
+    for start in range(0, len(items), batch_size):
+        await db.execute(statement, [
+            {"liquor_id": liquor_id, "sold": sold}
+            for liquor_id, sold in items[start:start + batch_size]
+        ])
+    return len(items)
+
+def query_sales():
+    """
+    Consulta base de ventas con sus líneas cargadas de forma anticipada
+    selectinload trae las líneas de todas las ventas de la página en una sola
+    consulta adicional, en lugar de una consulta por venta al serializar
+    (en modo asíncrono la carga perezosa no está permitida)
+    """
+    return select(models.Sale).options(selectinload(models.Sale.sale_lines))
+
+async def get_sale(db: AsyncSession, sale_id: int) -> Optional[models.Sale]:
     """Obtiene una venta específica por su ID"""
-    return db.query(models.Sale).filter(models.Sale.id == sale_id).first()
+    return (await db.scalars(query_sales().where(models.Sale.id == sale_id))).first()
+
+# Columnas de schemas.Sale (el ID primero) y de schemas.SaleLine, para los
+# listados y la exportación de ventas sin objetos ORM
+SALE_COLUMNS = [models.Sale.id] + [
+    models.Sale.__table__.c[name]
+    for name in schemas.Sale.model_fields if name not in ("id", "sale_lines")
+]
+SALE_LINE_COLUMNS = [
+    models.SaleLine.__table__.c[name] for name in schemas.SaleLine.model_fields
+]
+
+def include_sale_lines(fields: Optional[Sequence[str]]) -> bool:
+    """Si una selección de campos de ventas incluye sus líneas"""
+    return fields is None or "sale_lines" in fields
+
+async def load_sales(
+    db: AsyncSession, query, fields: Optional[Tuple[str, ...]] = None
+) -> List[schemas.Sale]:
+    """
+    Ejecuta una consulta de SALE_COLUMNS (o de las columnas de fields) y
+    agrega las líneas de todas las ventas con una segunda consulta (como
+    selectinload), leyendo columnas en lugar de objetos ORM. Si fields no
+    incluye sale_lines, las líneas no se consultan
+    Retorna esquemas validados en una sola llamada
+    """
+    sales = [dict(row._mapping) for row in (await db.execute(query)).all()]
+    by_id = {}
+    if include_sale_lines(fields):
+        for sale in sales:
+            sale["sale_lines"] = []
+            by_id[sale["id"]] = sale
+    if by_id:
+        lines = await db.execute(
+            select(models.SaleLine.sale_id, *SALE_LINE_COLUMNS)
+            .where(models.SaleLine.sale_id.in_(by_id))
+            .order_by(models.SaleLine.sale_id, models.SaleLine.id)
+        )
+        names = [column.name for column in SALE_LINE_COLUMNS]
+        for sale_id, *values in lines.all():
+            by_id[sale_id]["sale_lines"].append(dict(zip(names, values)))
+    return schemas.list_adapter(schemas.Sale, fields).validate_python(sales)
 
-def get_sales(db: Session, skip: int = 0, limit: int = 100) -> List[models.Sale]:
-    """Obtiene lista de ventas con paginación"""
-    return db.query(models.Sale).offset(skip).limit(limit).all()
+async def get_sales(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    after_id: Optional[int] = None,
+    fields: Optional[Tuple[str, ...]] = None
+) -> List[schemas.Sale]:
+    """
+    Obtiene lista de ventas con sus líneas, con paginación
+    Si se indica after_id se usa paginación por cursor (keyset) sobre el ID
+    Con fields solo se leen esas columnas (y las líneas si se piden)
+    """
+    query = select(*selected_columns(SALE_COLUMNS, fields)).order_by(models.Sale.id)
+    if after_id is not None:
+        query = query.where(models.Sale.id > after_id)
+    else:
+        query = query.offset(skip)
+    return await load_sales(db, query.limit(limit), fields)
 
-def get_sales_by_customer(db: Session, customer_id: str) -> List[models.Sale]:
+def sale_export_statement(
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    fields: Optional[Tuple[str, ...]] = None
+):
+    """
+    Un solo JOIN de ventas y líneas para la exportación, ordenado por
+    (sale_date, id) y luego por línea: las líneas de cada venta llegan
+    juntas y pueden agruparse mientras se leen. Las ventas sin líneas se
+    incluyen con las columnas de la línea en NULL
+    Si fields no incluye sale_lines se leen solo las ventas, sin JOIN
+    Args:
+        date_from: Fecha inicial (inclusive)
+        date_to: Fecha final (exclusiva)
+        fields: Selección de campos de la venta (None: todos)
+    """
+    query = (
+        select(*selected_columns(SALE_COLUMNS, fields))
+        .order_by(models.Sale.sale_date, models.Sale.id)
+    )
+    if include_sale_lines(fields):
+        query = (
+            query.add_columns(*SALE_LINE_COLUMNS)
+            .outerjoin(models.SaleLine, models.SaleLine.sale_id == models.Sale.id)
+            .order_by(models.SaleLine.id)
+        )
+    if date_from is not None:
+        query = query.where(models.Sale.sale_date >= date_from)
+    if date_to is not None:
+        query = query.where(models.Sale.sale_date < date_to)
+    return query
+
+async def get_sales_by_customer(
+    db: AsyncSession, customer_id: str, fields: Optional[Tuple[str, ...]] = None
+) -> List[schemas.Sale]:
     """Obtiene todas las ventas de un cliente específico"""
-    return db.query(models.Sale).filter(models.Sale.customer_id == customer_id).all()
+    query = select(*selected_columns(SALE_COLUMNS, fields))
+    return await load_sales(db, query.where(models.Sale.customer_id == customer_id), fields)
 
-def update_sale_status(db: Session, sale_id: int, status: str) -> Optional[models.Sale]:
+async def update_sale_status(db: AsyncSession, sale_id: int, status: str) -> Optional[models.Sale]:
     """
     Actualiza el estado de una venta
     Estados posibles: "completed", "cancelled", "pending"
     """
-    db_sale = get_sale(db, sale_id)
+    db_sale = await get_sale(db, sale_id)
     if db_sale:
         db_sale.status = status
-        db.commit()
-        db.refresh(db_sale)
+        await db.commit()
     return db_sale
 
 #############################################
 # FUNCIONES DE UTILIDAD PARA INVENTARIO
 #############################################
 
-def check_low_stock(db: Session) -> List[models.Liquor]:
+async def check_low_stock(db: AsyncSession) -> List[models.Liquor]:
     """
     Obtiene lista de licores con stock bajo
     Útil para sistema de alertas de reabastecimiento
     """
-    return db.query(models.Liquor).filter(
-        models.Liquor.stock <= models.Liquor.minimum_stock
-    ).all()
+    # Se expresa como stock - minimum_stock para usar el índice ix_liquors_low_stock
+    query = select(models.Liquor).where(
+        models.Liquor.stock - models.Liquor.minimum_stock <= 0
+    )
+    return (await db.scalars(query)).all()
 
-def update_stock(db: Session, liquor_id: int, quantity: int) -> Optional[models.Liquor]:
+async def update_stock(db: AsyncSession, liquor_id: int, quantity: int) -> Optional[models.Liquor]:
     """
-    Actualiza el stock de un licor
+    Actualiza el stock de un licor con un solo UPDATE condicional, como
+    reserve_stock: no pisa el descuento de una venta concurrente y la
+    condición stock + cantidad >= 0 impide dejar stock negativo
     Args:
         quantity: Cantidad a agregar (positivo) o restar (negativo)
+    Returns:
+        El licor actualizado o None si no existe
+    Lanza ValueError si el stock no alcanza para restar quantity
     """
-    db_liquor = get_liquor(db, liquor_id)
-    if db_liquor:
-        db_liquor.stock += quantity
-        db_liquor.is_available = db_liquor.stock > 0
-        db_liquor.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(db_liquor)
-    return db_liquor
\ No newline at end of file
+    try:
+        stock = models.Liquor.stock + quantity
+        db_liquor = (await db.scalars(
+            update(models.Liquor)
+            .where(models.Liquor.id == liquor_id, stock >= 0)
+            .values(stock=stock, is_available=stock > 0, updated_at=datetime.utcnow())
+            .returning(models.Liquor)
+            .execution_options(populate_existing=True)
+        )).first()
+        if db_liquor is None:
+            await db.rollback()
+            if await get_liquor(db, liquor_id) is None:
+                return None
+            raise ValueError(f"Stock insuficiente: el licor {liquor_id} tiene menos de {-quantity} unidades")
+        await db.commit()
+        invalidate_liquors(liquor_id)
+        return db_liquor
+    except SQLAlchemyError as e:
+        logger.error(f"Error al actualizar el stock: {str(e)}")
+        await db.rollback()
+        raise
\ No newline at end of file
@@ -1,11 +1,23 @@
 # Importamos las dependencias necesarias de SQLAlchemy
-from sqlalchemy import create_engine, inspect
+from sqlalchemy import event, func, inspect, select, text
+from sqlalchemy.exc import TimeoutError as SATimeoutError
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 from pathlib import Path
+import asyncio
+import hashlib
 import os
+import tempfile
 from dotenv import load_dotenv
 import logging
+import random
+import threading
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from .worker_stats import WorkerStatsBoard
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -29,53 +41,400 @@ logger.info(f"Usando base de datos en: {DATABASE_URL}")
 if DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
+# Usamos drivers asíncronos para no bloquear el event loop de los workers
+# (aiosqlite para SQLite y asyncpg para PostgreSQL), salvo que la URL ya indique uno
+if DATABASE_URL.startswith("sqlite:"):
+    DATABASE_URL = DATABASE_URL.replace("sqlite:", "sqlite+aiosqlite:", 1)
+elif DATABASE_URL.startswith("postgresql:"):
+    DATABASE_URL = DATABASE_URL.replace("postgresql:", "postgresql+asyncpg:", 1)
+
+class PoolStats:
+    """
+    Acumula las esperas para obtener una conexión del pool en este worker
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float, timed_out: bool = False):
+        with self.lock:
+            self.checkouts += 1
+            self.timeouts += int(timed_out)
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+pool_stats = PoolStats()
+
+# Tablero compartido con los contadores del pool de cada worker de la máquina:
+# /diagnostico/pool/workers lo lee desde cualquier worker
+POOL_STATS_PATH = os.getenv(
+    "POOL_STATS_PATH",
+    os.path.join(
+        tempfile.gettempdir(),
+        f"liquors_pool_{hashlib.sha1(DATABASE_URL.encode()).hexdigest()[:12]}.stats"
+    )
+)
+POOL_COUNTERS = ("checkouts", "timeouts", "total_wait", "max_wait", "checked_out", "idle", "overflow")
+pool_board = WorkerStatsBoard(POOL_STATS_PATH, POOL_COUNTERS)
+
+def pool_counters(pool) -> dict:
+    """
+    Contadores del pool de este worker, tal como se publican en pool_board
+    """
+    with pool_stats.lock:
+        return {
+            "checkouts": pool_stats.checkouts,
+            "timeouts": pool_stats.timeouts,
+            "total_wait": pool_stats.total_wait,
+            "max_wait": pool_stats.max_wait,
+            "checked_out": pool.checkedout(),
+            "idle": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+        }
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    QueuePool que mide cuánto espera cada petición por una conexión libre y
+    publica sus contadores en pool_board al entregar y devolver conexiones
+    """
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except SATimeoutError:
+            pool_stats.record(time.perf_counter() - start, timed_out=True)
+            pool_board.publish(pool_counters(self))
+            raise
+        pool_stats.record(time.perf_counter() - start)
+        pool_board.publish(pool_counters(self))
+        return connection
+
+    def _do_return_conn(self, record):
+        super()._do_return_conn(record)
+        pool_board.publish(pool_counters(self))
+
+# Configuración del pool de conexiones (por worker) desde variables de entorno
+# Con varios workers el total de conexiones es workers * (pool_size + max_overflow)
+POOL_SETTINGS = {
+    "poolclass": TimedQueuePool,
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes"),
+}
+
+# Registro de SQL: echo completo sólo si se pide explícitamente (DB_ECHO=true);
+# por defecto se registran las consultas lentas y una muestra del resto
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() in ("1", "true", "yes")
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+QUERY_SAMPLE_RATE = float(os.getenv("DB_QUERY_SAMPLE_RATE", "0"))
+
+# Endpoint que originó la consulta, fijado por un middleware de la aplicación
+current_endpoint: ContextVar[str] = ContextVar("current_endpoint", default="-")
+
+# Perfil de rendimiento para SQLite, aplicado a cada conexión nueva
+# WAL permite lecturas concurrentes con un escritor y busy_timeout hace que los
+# workers esperen el bloqueo de escritura en lugar de fallar con "database is locked".
+# Una variable vacía desactiva el pragma correspondiente.
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)),
+    "cache_size": os.getenv("SQLITE_CACHE_SIZE", "-64000"),  # Negativo: KiB
+    "busy_timeout": os.getenv("SQLITE_BUSY_TIMEOUT", "15000"),  # Milisegundos
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Aplica el perfil SQLITE_PRAGMAS a una conexión SQLite recién abierta
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma, value in SQLITE_PRAGMAS.items():
+            if not value:
+                continue
+            if not value.lstrip("-").isalnum():
+                raise ValueError(f"Valor inválido para PRAGMA {pragma}: {value}")
+            cursor.execute(f"PRAGMA {pragma}={value}")
+    finally:
+        cursor.close()
+
 # Configuramos el motor de la base de datos
 if DATABASE_URL.startswith("sqlite"):
     # Configuración específica para SQLite
-    engine = create_engine(
+    engine = create_async_engine(
         DATABASE_URL,
         connect_args={"check_same_thread": False},
-        echo=True
+        echo=DB_ECHO,
+        **POOL_SETTINGS
     )
-    logger.info("Usando configuración SQLite")
+    event.listen(engine.sync_engine, "connect", set_sqlite_pragmas)
+    logger.info(f"Usando configuración SQLite: {SQLITE_PRAGMAS}")
 else:
     # Configuración para PostgreSQL
-    engine = create_engine(
+    engine = create_async_engine(
         DATABASE_URL,
-        echo=True
+        echo=DB_ECHO,
+        **POOL_SETTINGS
     )
     logger.info("Usando configuración PostgreSQL")
 
-# Creamos una clase de sesión local
-SessionLocal = sessionmaker(
-    autocommit=False,
+# SQLite admite un solo escritor y busy_timeout no atiende en orden a quienes
+# esperan el bloqueo: con muchas transacciones esperando a la vez, algunas agotan
+# el plazo aunque cada escritura dure milisegundos. Las escrituras de un mismo
+# worker se ponen en fila, así cada worker compite con una sola transacción
+sqlite_write_lock = asyncio.Lock() if DATABASE_URL.startswith("sqlite") else None
+
+@asynccontextmanager
+async def serialized_write():
+    """Fila de escritura del worker en SQLite; en PostgreSQL no hace nada"""
+    if sqlite_write_lock is None:
+        yield
+        return
+    async with sqlite_write_lock:
+        yield
+
+slow_query_logger = logging.getLogger(f"{__name__}.slow_query")
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append((cursor, time.perf_counter()))
+
+@event.listens_for(engine.sync_engine, "handle_error")
+def _discard_query_timer(exception_context):
+    """
+    Una sentencia que falla no llega a after_cursor_execute: se descarta su
+    inicio para no desfasar las mediciones siguientes de la misma conexión
+    (un error al leer filas, después de after_cursor_execute, no tiene inicio)
+    """
+    # ExceptionContext.cursor no se asigna en SQLAlchemy 2.0: se usa el del contexto
+    connection, context = exception_context.connection, exception_context.execution_context
+    starts = connection.info.get("query_start") if connection is not None else None
+    if starts and context is not None and starts[-1][0] is context.cursor:
+        starts.pop()
+
+class CountingCursor:
+    """
+    Envoltura del cursor DBAPI de una consulta que retorna filas: las cuenta a
+    medida que se leen y llama a on_close con el total cuando SQLAlchemy cierra
+    el cursor (al agotar o cerrar el resultado). En un SELECT el número de filas
+    solo se conoce después del fetch
+    Reemplaza ExecutionContext.cursor, que SQLAlchemy lee al construir el
+    resultado: por eso requirements.txt fija SQLAlchemy 2.0.x, y
+    tests/test_query_log.py comprueba el conteo al actualizarlo
+    """
+    def __init__(self, cursor, on_close):
+        self._cursor = cursor
+        self._on_close = on_close
+        self.rows = 0
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self.rows += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self.rows += len(rows)
+        return rows
+
+    def close(self):
+        try:
+            self._cursor.close()
+        finally:
+            on_close, self._on_close = self._on_close, None
+            if on_close is not None:
+                on_close(self.rows)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _log_slow_query(conn, cursor, statement, parameters, context, executemany):
+    """
+    Registra la consulta si supera DB_SLOW_QUERY_MS o si cae en la muestra
+    DB_QUERY_SAMPLE_RATE, con su duración, filas y endpoint de origen
+    Las consultas que retornan filas se registran al cerrar su cursor, con las
+    filas leídas; el resto, de inmediato con las filas afectadas (rowcount)
+    """
+    elapsed_ms = (time.perf_counter() - conn.info["query_start"].pop()[1]) * 1000
+    slow = elapsed_ms >= SLOW_QUERY_MS
+    if not slow and (QUERY_SAMPLE_RATE <= 0 or random.random() >= QUERY_SAMPLE_RATE):
+        return
+    endpoint = current_endpoint.get()
+
+    def log(rows):
+        slow_query_logger.log(
+            logging.WARNING if slow else logging.INFO,
+            "%s %.1f ms rows=%s endpoint=%s sql=%s",
+            "Consulta lenta" if slow else "Consulta",
+            elapsed_ms,
+            rows,
+            endpoint,
+            " ".join(statement.split())
+        )
+
+    # En un executemany (p. ej. los lotes de insertmanyvalues) SQLAlchemy lee
+    # las filas del cursor original, que no pasa por la envoltura
+    if cursor.description is not None and not executemany and context is not None:
+        context.cursor = CountingCursor(cursor, log)
+    else:
+        log(cursor.rowcount if cursor.rowcount >= 0 else "?")
+
+# Creamos una clase de sesión local (asíncrona)
+# expire_on_commit=False evita recargas implícitas, que no están permitidas en async
+SessionLocal = async_sessionmaker(
     autoflush=False,
+    expire_on_commit=False,
     bind=engine
 )
 
 # Creamos la clase base para los modelos declarativos
 Base = declarative_base()
 
-def verify_tables():
+async def verify_tables():
     """
     Verifica qué tablas existen en la base de datos
     """
-    inspector = inspect(engine)
-    tables = inspector.get_table_names()
+    async with engine.connect() as conn:
+        tables = await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_table_names())
     logger.info(f"Tablas existentes en la base de datos: {tables}")
     return tables
 
-def get_db():
+def format_pool_status(pid: int, counters: dict) -> dict:
+    """
+    Estado del pool de un worker (schemas.PoolStatus) a partir de sus contadores
+    """
+    checkouts = int(counters["checkouts"])
+    return {
+        "pid": int(pid),
+        "pool_size": POOL_SETTINGS["pool_size"],
+        "checked_out": int(counters["checked_out"]),
+        "idle": int(counters["idle"]),
+        "overflow": int(counters["overflow"]),
+        "max_overflow": POOL_SETTINGS["max_overflow"],
+        "checkouts": checkouts,
+        "timeouts": int(counters["timeouts"]),
+        "avg_wait_ms": counters["total_wait"] / checkouts * 1000 if checkouts else 0.0,
+        "max_wait_ms": counters["max_wait"] * 1000,
+    }
+
+def pool_status():
+    """
+    Retorna el estado del pool de conexiones del worker actual
+    """
+    return format_pool_status(os.getpid(), pool_counters(engine.pool))
+
+def workers_pool_status():
+    """
+    Retorna el estado del pool de cada worker vivo que publicó en pool_board,
+    ordenado por PID. El del worker actual se lee directamente del pool; sin
+    fcntl (Windows) es el único que se conoce
+    """
+    workers = {int(row["pid"]): format_pool_status(row["pid"], row) for row in pool_board.snapshot()}
+    workers[os.getpid()] = pool_status()
+    return [workers[pid] for pid in sorted(workers)]
+
+# Resultado de la verificación perezosa del esquema (una vez por worker)
+schema_checked = False
+
+async def check_schema():
+    """
+    Verifica una sola vez por worker, en la primera petición, que existan las
+    tablas de los modelos. La creación del esquema no se hace al arrancar los
+    workers sino con el comando de inicialización: python -m app.database
+    """
+    global schema_checked
+    if schema_checked:
+        return
+    # Importamos los modelos aquí para evitar importación circular
+    from . import models
+    missing = sorted(set(Base.metadata.tables) - set(await verify_tables()))
+    if missing:
+        logger.error(
+            f"Faltan tablas en la base de datos: {missing}. "
+            "Ejecuta 'python -m app.database' para inicializarla"
+        )
+        raise RuntimeError(f"Faltan tablas en la base de datos: {missing}")
+    schema_checked = True
+
+async def get_db():
     """
     Genera una sesión de base de datos y asegura que se cierre después de usarla
     """
-    db = SessionLocal()
-    try:
+    await check_schema()
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-def init_db():
+async def get_write_db():
+    """
+    Como get_db, para los endpoints que escriben: en SQLite la petición espera
+    su turno en la fila de escritura del worker (serialized_write) y la
+    conserva hasta cerrar la sesión. Los procesos largos, como la importación
+    de ventas, usan get_db y toman la fila por lote
+    """
+    await check_schema()
+    async with serialized_write():
+        async with SessionLocal() as db:
+            yield db
+
+def create_missing_indexes(sync_conn):
+    """
+    Crea los índices declarados en los modelos que aún no existen en la base
+    de datos (migración idempotente para bases creadas con versiones anteriores)
+    """
+    # IF NOT EXISTS en lugar de checkfirst: la reflexión de SQLAlchemy no
+    # detecta índices de expresión como ix_liquors_low_stock
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.unique and has_duplicates(sync_conn, index):
+                logger.error(
+                    f"No se creó el índice único {index.name}: hay filas repetidas en "
+                    f"({', '.join(column.name for column in index.columns)}); "
+                    f"corrígelas y vuelve a ejecutar 'python -m app.database'"
+                )
+                continue
+            sync_conn.execute(CreateIndex(index, if_not_exists=True))
+
+# Índices reemplazados por versiones posteriores de los modelos: (tabla, índice
+# anterior, índice que lo reemplaza). Seguirían encareciendo cada escritura
+SUPERSEDED_INDEXES = (
+    ("liquors", "ix_liquors_category", "ix_liquors_category_id"),
+    ("liquors", "ix_liquors_brand", "ix_liquors_brand_name_volume_ml"),
+)
+
+def drop_superseded_indexes(sync_conn):
+    """
+    Elimina los índices de SUPERSEDED_INDEXES. Se ejecuta después de
+    create_missing_indexes: si el reemplazo es un índice único que no se pudo
+    crear por filas repetidas, el índice anterior se conserva
+    """
+    for table, name, replacement in SUPERSEDED_INDEXES:
+        index = next(index for index in Base.metadata.tables[table].indexes if index.name == replacement)
+        if index.unique and has_duplicates(sync_conn, index):
+            continue
+        sync_conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+def has_duplicates(sync_conn, index) -> bool:
+    """Indica si las filas existentes impiden crear un índice único"""
+    columns = list(index.columns)
+    duplicate = sync_conn.execute(
+        select(*columns).group_by(*columns).having(func.count() > 1).limit(1)
+    ).first()
+    return duplicate is not None
+
+async def init_db():
     """
     Crea todas las tablas en la base de datos
     """
@@ -83,8 +442,15 @@ def init_db():
         # Importamos los modelos aquí para evitar importación circular
         from . import models
         logger.info("Creando tablas en la base de datos...")
-        Base.metadata.create_all(bind=engine)
-        tables = verify_tables()
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            # create_all no agrega índices a tablas que ya existían; los creamos aquí
+            await conn.run_sync(create_missing_indexes)
+            await conn.run_sync(drop_superseded_indexes)
+            # Índice de búsqueda de texto completo (FTS5 o tsvector según el motor)
+            from .search import create_search_index
+            await conn.run_sync(create_search_index)
+        tables = await verify_tables()
         if not tables:
             logger.error("No se encontraron tablas después de la creación")
         else:
@@ -93,22 +459,23 @@ def init_db():
         logger.error(f"Error al crear las tablas: {e}")
         raise
 
-def check_db_connection():
+async def check_db_connection():
     """
     Verifica si la conexión a la base de datos está funcionando
     """
     try:
-        db = SessionLocal()
-        db.execute("SELECT 1")
-        db.close()
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
         logger.info("Conexión a la base de datos exitosa")
         return True
     except Exception as e:
         logger.error(f"Error al conectar con la base de datos: {e}")
         return False
 
-# Si este archivo se ejecuta directamente, inicializa la base de datos
-if __name__ == "__main__":
+async def main():
+    """
+    Verifica la conexión e inicializa la base de datos
+    """
     logger.info("Iniciando verificación de la base de datos...")
     
     # Verificar si el archivo de base de datos existe (para SQLite)
@@ -119,13 +486,23 @@ if __name__ == "__main__":
         else:
             logger.warning(f"No se encontró archivo de base de datos en: {db_path}")
     
-    # Verificar conexión
-    if check_db_connection():
-        # Inicializar la base de datos
-        init_db()
-        # Verificar tablas
-        tables = verify_tables()
-        if tables:
-            logger.info("Base de datos lista para usar")
-        else:
-            logger.error("No se encontraron tablas en la base de datos")
+    try:
+        # Verificar conexión
+        if await check_db_connection():
+            # Inicializar la base de datos
+            await init_db()
+            # Verificar tablas
+            tables = await verify_tables()
+            if tables:
+                logger.info("Base de datos lista para usar")
+            else:
+                logger.error("No se encontraron tablas en la base de datos")
+    finally:
+        await engine.dispose()
+
+# Si este archivo se ejecuta directamente, inicializa la base de datos
+if __name__ == "__main__":
+    # Usamos el módulo importado como app.database para compartir la misma Base
+    # que los modelos (ejecutado con -m este archivo es __main__, con otra Base)
+    from app import database
+    asyncio.run(database.main())
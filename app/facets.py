@@ -0,0 +1,100 @@
+# Conteos por faceta del catálogo (categoría, marca, proveedor y rangos de
+# precio y graduación) calculados en una sola consulta agregada
+from typing import Dict, List, Sequence
+
+from sqlalchemy import String, case, cast, func, literal, literal_column, null, select, union_all
+
+from . import models
+
+# Límites de los rangos: [0, 20), [20, 50), ..., [200, ∞)
+PRICE_BANDS = (20, 50, 100, 200)
+ALCOHOL_CONTENT_BANDS = (5, 15, 30, 40)
+
+
+def band_labels(bounds: Sequence[float]) -> List[str]:
+    """Etiquetas de los rangos: "0-20", "20-50", ..., "200+" """
+    edges = [0, *bounds]
+    labels = [f"{low:g}-{high:g}" for low, high in zip(edges, edges[1:])]
+    labels.append(f"{edges[-1]:g}+")
+    return labels
+
+
+def band_expression(column, bounds: Sequence[float]):
+    """
+    Expresión SQL con la etiqueta del rango al que pertenece cada fila
+    Límites y etiquetas van como literales (no parámetros) para que la
+    expresión del SELECT y la del GROUP BY sean idénticas en PostgreSQL
+    """
+    labels = [literal_column(f"'{label}'", String) for label in band_labels(bounds)]
+    return case(
+        (column.is_(None), null()),
+        *((column < literal_column(f"{bound:g}"), label) for bound, label in zip(bounds, labels)),
+        else_=labels[-1]
+    )
+
+
+# Facetas y la expresión por la que se agrupa cada una
+FACETS = {
+    "category": cast(models.Liquor.category, String),
+    "brand": models.Liquor.brand,
+    "supplier": models.Liquor.supplier,
+    "price": band_expression(models.Liquor.price, PRICE_BANDS),
+    "alcohol_content": band_expression(models.Liquor.alcohol_content, ALCOHOL_CONTENT_BANDS),
+}
+
+BAND_ORDER = {
+    "price": band_labels(PRICE_BANDS),
+    "alcohol_content": band_labels(ALCOHOL_CONTENT_BANDS),
+}
+
+
+def facets_statement(conditions: Dict[str, object]):
+    """
+    Una sola consulta (UNION ALL) con el total y el conteo por valor de cada
+    faceta. conditions asocia cada filtro a su condición WHERE; la rama de una
+    faceta ignora el filtro del mismo nombre, de modo que al elegir una
+    categoría se siguen viendo los conteos de las demás categorías
+    """
+    branches = [
+        select(
+            literal("total").label("facet"),
+            cast(null(), String).label("value"),
+            func.count().label("count")
+        )
+        .select_from(models.Liquor)
+        .where(*conditions.values())
+    ]
+    for facet, expression in FACETS.items():
+        branches.append(
+            select(
+                literal(facet).label("facet"),
+                expression.label("value"),
+                func.count().label("count")
+            )
+            .where(*(condition for name, condition in conditions.items() if name != facet))
+            .group_by(expression)
+        )
+    return union_all(*branches)
+
+
+def group_facets(rows, facet_limit: int) -> dict:
+    """
+    Agrupa las filas de facets_statement por faceta: las de valores discretos
+    de mayor a menor conteo (hasta facet_limit) y los rangos en su orden
+    """
+    result = {facet: [] for facet in FACETS}
+    result["total"] = 0
+    for facet, value, count in rows:
+        if facet == "total":
+            result["total"] = count
+        elif value is not None:
+            if facet == "category":
+                value = models.LiquorCategory[value].value
+            result[facet].append({"value": value, "count": count})
+    for facet, order in BAND_ORDER.items():
+        result[facet].sort(key=lambda bucket: order.index(bucket["value"]))
+    for facet in ("category", "brand", "supplier"):
+        result[facet] = sorted(
+            result[facet], key=lambda bucket: (-bucket["count"], bucket["value"])
+        )[:facet_limit]
+    return result
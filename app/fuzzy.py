@@ -0,0 +1,123 @@
+# Búsqueda aproximada (tolerante a errores de escritura) por trigramas
+# Se usa en SQLite; en PostgreSQL la resuelve pg_trgm (ver search.py)
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from heapq import nlargest
+from typing import Dict, Iterable, List, Set, Tuple
+import os
+import re
+
+
+# Similitud mínima (0-1) para considerar que un licor coincide
+# (en PostgreSQL es pg_trgm.word_similarity_threshold)
+FUZZY_THRESHOLD = float(os.getenv("FUZZY_THRESHOLD", "0.5"))
+
+
+def trigrams(text: str) -> Set[str]:
+    """
+    Trigramas de cada palabra de un texto ya normalizado, con el mismo
+    relleno que pg_trgm: dos espacios al inicio y uno al final
+    ("ron" -> "  r", " ro", "ron", "on ")
+    """
+    grams = set()
+    for word in re.findall(r"\w+", text):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    """
+    Índice de trigramas en dos niveles, como un corrector ortográfico:
+    - trigrama -> palabras del vocabulario del catálogo que lo contienen
+    - palabra -> IDs de los licores que la usan (arreglo ordenado de enteros)
+    Cada palabra de la búsqueda se compara solo con el vocabulario (mucho más
+    pequeño que el catálogo) y las palabras parecidas se traducen a licores;
+    nunca se calcula la distancia de edición contra todas las filas.
+    """
+    def __init__(self):
+        self.words: Dict[str, array] = {}
+        self.grams: Dict[str, Set[str]] = {}
+        self.sizes: Dict[int, int] = {}
+
+    def add(self, liquor_id: int, text: str):
+        """Agrega un licor (texto ya normalizado); debe no estar en el índice"""
+        words = set(re.findall(r"\w+", text))
+        self.sizes[liquor_id] = len(words)
+        for word in words:
+            ids = self.words.get(word)
+            if ids is None:
+                self.words[word] = array("q", [liquor_id])
+                for gram in trigrams(word):
+                    self.grams.setdefault(gram, set()).add(word)
+            elif ids[-1] < liquor_id:
+                ids.append(liquor_id)
+            else:
+                ids.insert(bisect_left(ids, liquor_id), liquor_id)
+
+    def add_many(self, items: Iterable[Tuple[int, str]]):
+        """Agrega varios licores; en orden de ID los arreglos solo crecen al final"""
+        for liquor_id, text in items:
+            self.add(liquor_id, text)
+
+    def remove(self, liquor_id: int, text: str):
+        """Quita un licor indexado con el texto indicado"""
+        self.sizes.pop(liquor_id, None)
+        for word in set(re.findall(r"\w+", text)):
+            ids = self.words.get(word)
+            if ids is None:
+                continue
+            position = bisect_left(ids, liquor_id)
+            if position < len(ids) and ids[position] == liquor_id:
+                del ids[position]
+            if not ids:
+                del self.words[word]
+                for gram in trigrams(word):
+                    self.grams[gram].discard(word)
+                    if not self.grams[gram]:
+                        del self.grams[gram]
+
+    def similar_words(self, word: str, threshold: float) -> List[Tuple[float, str]]:
+        """
+        Palabras del vocabulario que contienen al menos threshold de los
+        trigramas de word, con esa fracción como similitud (de menor a mayor)
+        """
+        grams = trigrams(word)
+        counts = Counter()
+        for gram in grams:
+            counts.update(self.grams.get(gram, ()))
+        return sorted(
+            (count / len(grams), candidate)
+            for candidate, count in counts.items()
+            if count / len(grams) >= threshold
+        )
+
+    def match(self, text: str, limit: int, threshold: float = FUZZY_THRESHOLD) -> List[int]:
+        """
+        IDs de los licores más parecidos a un texto ya normalizado.
+        La puntuación de un licor es el promedio, para cada palabra buscada,
+        de la similitud de su palabra más parecida; a igualdad se prefieren
+        los licores con menos palabras
+        """
+        query_words = list(dict.fromkeys(re.findall(r"\w+", text)))
+        if not query_words:
+            return []
+        scores: Dict[int, float] = {}
+        for word in query_words:
+            best: Dict[int, float] = {}
+            # De menor a mayor similitud: la mejor palabra de cada licor queda al final
+            for similarity, candidate in self.similar_words(word, threshold):
+                best.update(dict.fromkeys(self.words[candidate], similarity))
+            if not scores:
+                scores = best
+                continue
+            get = scores.get
+            for liquor_id, similarity in best.items():
+                scores[liquor_id] = get(liquor_id, 0.0) + similarity
+        required = threshold * len(query_words)
+        return nlargest(
+            limit,
+            (liquor_id for liquor_id, score in scores.items() if score >= required),
+            key=lambda liquor_id: (scores[liquor_id], -self.sizes[liquor_id], -liquor_id)
+        )
@@ -1,23 +1,27 @@
-from fastapi import FastAPI, HTTPException, Depends, Query
-from sqlalchemy.orm import Session
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from . import crud, models, schemas
-from .database import engine, get_db, verify_tables
+from .database import engine, get_db, get_write_db, check_schema, pool_status, workers_pool_status, current_endpoint
+from .export import EXPORT_MEDIA_TYPES, EXPORT_RESPONSES, export_nested, export_rows
+from .pagination import encode_cursor, decode_cursor
+from .cache import liquor_cache
+from .autocomplete import autocomplete_index
+from .sales_import import SaleImporter, csv_records, ndjson_records
 from datetime import datetime
+import asyncio
+import hashlib
+import json
 import logging
-from sqlalchemy.exc import SQLAlchemyError
+import os
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from pydantic import TypeAdapter, ValidationError
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Crear las tablas de la base de datos
-models.Base.metadata.create_all(bind=engine)
-
-# Verificar las tablas creadas
-tables = verify_tables()
-logger.info(f"Tablas disponibles en la base de datos: {tables}")
-
 # Inicializamos la aplicación FastAPI
 app = FastAPI(
     title="Licores API",
@@ -25,21 +29,173 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Cabecera con el cursor de la siguiente página (paginación por cursor)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def cursor_values(cursor: Optional[str], sort_by: str = "id", order: str = "asc") -> Optional[list]:
+    """
+    Obtiene la clave de la última fila vista a partir de un cursor opaco
+    Retorna None si no se envió cursor (modo offset); 400 si el cursor es
+    inválido o se generó con otro ordenamiento
+    """
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor, sort_by, order)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def cursor_after_id(cursor: Optional[str]) -> Optional[int]:
+    """
+    Obtiene el ID de la última fila vista a partir de un cursor opaco
+    Retorna None si no se envió cursor (modo offset)
+    """
+    values = cursor_values(cursor)
+    if values is None:
+        return None
+    if not isinstance(values[-1], int):
+        raise HTTPException(status_code=400, detail=f"Cursor inválido: {cursor}")
+    return values[-1]
+
+def requested_fields(model: type, fields: Optional[str]) -> Optional[tuple]:
+    """
+    Selección de campos del parámetro fields ("id,name,price"); None si no se envió
+    """
+    try:
+        return schemas.parse_fields(model, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def set_next_cursor(
+    response: Response, items: list, limit: int, sort_by: str = "id", order: str = "asc"
+):
+    """
+    Agrega la cabecera X-Next-Cursor si la página está completa
+    El cursor lleva el ordenamiento y la clave de la última fila: [id] o [sort_key, id]
+    """
+    if items and len(items) == limit:
+        last = items[-1]
+        key = [last.id] if sort_by == "id" else [getattr(last, sort_by), last.id]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(key, sort_by, order)
+
+# Cache-Control de las respuestas del catálogo. Con max-age=0 los proxies
+# guardan la respuesta pero la revalidan siempre con If-None-Match
+CATALOG_CACHE_MAX_AGE = int(os.getenv("CATALOG_CACHE_MAX_AGE", "0"))
+CATALOG_CACHE_CONTROL = (
+    f"public, max-age={CATALOG_CACHE_MAX_AGE}" if CATALOG_CACHE_MAX_AGE > 0 else "public, no-cache"
+)
+
+def catalog_etag(liquors: list, fields: Optional[tuple] = None) -> str:
+    """
+    ETag fuerte para una representación del catálogo, derivado del ID y
+    updated_at de cada licor (cualquier escritura cambia updated_at) y de la
+    selección de campos, que cambia la representación
+    """
+    digest = hashlib.sha1()
+    if fields is not None:
+        digest.update(f"fields={','.join(fields)};".encode())
+    for liquor in liquors:
+        digest.update(f"{liquor.id}:{liquor.updated_at.isoformat()};".encode())
+    return f'"{digest.hexdigest()}"'
+
+def listing_etag(version: tuple, query: str) -> str:
+    """
+    ETag fuerte del listado del catálogo, derivado de la versión del catálogo
+    (crud.get_catalog_version) y de los parámetros de la petición. No depende
+    de las filas de la página: se calcula antes de consultarla, de modo que una
+    revalidación vigente responde 304 sin leer la página
+    """
+    updated_at, count = version
+    digest = hashlib.sha1(f"{updated_at}:{count};{query}".encode())
+    return f'"{digest.hexdigest()}"'
+
+def not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """
+    Agrega ETag y Cache-Control a la respuesta. Si el cliente ya tiene esa
+    versión (If-None-Match) retorna una respuesta 304 sin cuerpo
+    """
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CATALOG_CACHE_CONTROL
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return None
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    if etag in candidates or "*" in candidates:
+        return Response(status_code=304, headers=dict(response.headers))
+    return None
+
+def json_response(content: bytes, response: Response) -> Response:
+    """
+    Respuesta con un cuerpo JSON ya serializado (TypeAdapter.dump_json), con
+    las cabeceras agregadas al parámetro response. Evita la validación y
+    serialización de response_model, que se sigue declarando para OpenAPI
+    """
+    return Response(content, media_type="application/json", headers=dict(response.headers))
+
+async def liquor_ranges(
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    min_alcohol_content: Optional[float] = Query(None, ge=0, le=100),
+    max_alcohol_content: Optional[float] = Query(None, ge=0, le=100),
+    min_volume_ml: Optional[int] = Query(None, ge=0),
+    max_volume_ml: Optional[int] = Query(None, ge=0),
+    min_stock: Optional[int] = Query(None, ge=0),
+    max_stock: Optional[int] = Query(None, ge=0)
+) -> schemas.LiquorRanges:
+    """
+    Filtros por rango compartidos por el listado y las facetas (límites inclusivos)
+    """
+    try:
+        return schemas.LiquorRanges(
+            min_price=min_price, max_price=max_price,
+            min_alcohol_content=min_alcohol_content, max_alcohol_content=max_alcohol_content,
+            min_volume_ml=min_volume_ml, max_volume_ml=max_volume_ml,
+            min_stock=min_stock, max_stock=max_stock
+        )
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=schemas.validation_message(e))
+
+class TrackEndpointMiddleware:
+    """
+    Asocia las consultas SQL de la petición a su endpoint (registro de consultas lentas)
+    Middleware ASGI puro: @app.middleware("http") agrega una tarea y un stream
+    intermedio por petición solo para fijar una ContextVar
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = current_endpoint.set(f"{scope['method']} {scope['path']}")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_endpoint.reset(token)
+
+app.add_middleware(TrackEndpointMiddleware)
+
 @app.on_event("startup")
 async def startup_event():
+    # El esquema se crea con 'python -m app.database' (una vez por despliegue)
+    # y se verifica de forma perezosa en la primera petición de cada worker
     logger.info("Iniciando la aplicación...")
-    tables = verify_tables()
-    if not tables:
-        logger.warning("No se encontraron tablas en la base de datos")
-    else:
-        logger.info(f"Tablas encontradas: {tables}")
+    # El índice de autocompletado se construye en segundo plano para no
+    # retrasar el arranque; si falla, se reintenta en la primera consulta
+    autocomplete_index.refresh_task = asyncio.create_task(autocomplete_index.refresh())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Cerramos las conexiones del pool del worker
+    await engine.dispose()
 
 #############################################
 # ENDPOINTS PARA LICORES
 #############################################
 
 @app.post("/licores/", response_model=schemas.Liquor, tags=["Licores"])
-async def create_liquor(liquor: schemas.LiquorCreate, db: Session = Depends(get_db)):
+async def create_liquor(liquor: schemas.LiquorCreate, db: AsyncSession = Depends(get_write_db)):
     """
     Crear un nuevo licor
     - **name**: Nombre del licor
@@ -64,10 +220,12 @@ async def create_liquor(liquor: schemas.LiquorCreate, db: Session = Depends(get_
             raise HTTPException(status_code=400, detail="El stock no puede ser negativo")
         
         # Crear el licor
-        db_liquor = crud.create_liquor(db=db, liquor=liquor)
+        db_liquor = await crud.create_liquor(db=db, liquor=liquor)
         logger.info(f"Licor creado exitosamente con ID: {db_liquor.id}")
         
         return db_liquor
+    except IntegrityError as e:
+        raise integrity_error(e)
     except SQLAlchemyError as e:
         logger.error(f"Error de base de datos al crear licor: {str(e)}")
         raise HTTPException(
@@ -81,62 +239,412 @@ async def create_liquor(liquor: schemas.LiquorCreate, db: Session = Depends(get_
             detail=str(e)
         )
 
+# Clave natural: índice único ix_liquors_brand_name_volume_ml
+DUPLICATE_LIQUOR_DETAIL = "Ya existe un licor con la misma marca, nombre y volumen"
+
+def integrity_error(e: IntegrityError, detail: str = DUPLICATE_LIQUOR_DETAIL) -> HTTPException:
+    """
+    409 si se repite la clave natural de un licor; 400 si se viola otra
+    restricción de la base de datos
+    """
+    if crud.is_duplicate_liquor(e):
+        return HTTPException(status_code=409, detail=detail)
+    logger.error(f"Restricción de la base de datos violada: {e.orig}")
+    return HTTPException(status_code=400, detail="Los datos violan una restricción de la base de datos")
+
+# Carga masiva: filas por INSERT, máximo de filas por petición y formatos aceptados
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "1000"))
+BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", "50000"))
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+liquor_create_adapter = TypeAdapter(schemas.LiquorCreate)
+
+# El cuerpo se lee a mano para validar fila por fila; se documenta aquí
+BULK_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {
+                "schema": {"type": "array", "items": {"$ref": "#/components/schemas/LiquorCreate"}}
+            },
+            "application/x-ndjson": {
+                "schema": {"type": "string", "description": "Un LiquorCreate en JSON por línea"}
+            },
+        },
+    }
+}
+
+async def read_liquor_rows(request: Request):
+    """
+    Lee y valida el cuerpo de una carga masiva (arreglo JSON o NDJSON)
+    Retorna el total de filas, las válidas como pares (índice, LiquorCreate)
+    y un BulkItemResult con el motivo por cada fila inválida
+    Es una dependencia declarada antes de get_write_db: el cuerpo se recibe
+    antes de tomar la fila de escritura
+    """
+    body = await request.body()
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type in NDJSON_MEDIA_TYPES:
+        rows = [line for line in body.splitlines() if line.strip()]
+        validate = liquor_create_adapter.validate_json
+    else:
+        try:
+            rows = json.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="El cuerpo debe ser un arreglo JSON o NDJSON")
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=400, detail="El cuerpo debe ser un arreglo JSON o NDJSON")
+        validate = liquor_create_adapter.validate_python
+    if len(rows) > BULK_MAX_ROWS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Se permiten como máximo {BULK_MAX_ROWS} licores por petición"
+        )
+
+    valid = []
+    errors = []
+    for index, row in enumerate(rows):
+        try:
+            valid.append((index, validate(row)))
+        except ValidationError as e:
+            errors.append(schemas.BulkItemResult(
+                index=index, status="error", error=schemas.validation_message(e)
+            ))
+    return len(rows), valid, errors
+
+@app.post(
+    "/licores/bulk",
+    response_model=schemas.BulkLiquorResult,
+    tags=["Licores"],
+    openapi_extra=BULK_OPENAPI
+)
+async def create_liquors_bulk(
+    body: tuple = Depends(read_liquor_rows),
+    db: AsyncSession = Depends(get_write_db)
+):
+    """
+    Crear muchos licores en una sola petición (alta de un proveedor)
+    - Cuerpo: arreglo JSON de licores o NDJSON (un licor por línea, con
+      Content-Type: application/x-ndjson)
+    - Todas las filas se validan antes de insertar; las inválidas se reportan
+      en results con su motivo y las válidas se insertan por lotes
+    - Una fila cuya marca, nombre y volumen ya existen en el catálogo o en una
+      fila anterior de la petición se reporta como error y no se inserta
+    """
+    total, rows, results = body
+    logger.info(f"Recibida carga masiva de {total} licores")
+
+    first_index = {}
+    for index, liquor in rows:
+        first_index.setdefault((liquor.brand, liquor.name, liquor.volume_ml), index)
+    try:
+        existing = await crud.existing_liquor_keys(db, list(first_index), batch_size=BULK_BATCH_SIZE)
+    except SQLAlchemyError as e:
+        logger.error(f"Error de base de datos en la carga masiva: {e}")
+        raise HTTPException(status_code=500, detail=f"Error de base de datos: {e}")
+    valid = []
+    for index, liquor in rows:
+        key = (liquor.brand, liquor.name, liquor.volume_ml)
+        if key in existing:
+            error = f"{DUPLICATE_LIQUOR_DETAIL}; use /licores/upsert para actualizarlo"
+        elif first_index[key] != index:
+            error = f"Clave repetida de la fila {first_index[key]}: marca, nombre y volumen"
+        else:
+            valid.append((index, liquor))
+            continue
+        results.append(schemas.BulkItemResult(index=index, status="error", error=error))
+
+    ids = []
+    if valid:
+        try:
+            ids = await crud.create_liquors_bulk(
+                db, [liquor for _, liquor in valid], batch_size=BULK_BATCH_SIZE
+            )
+        except IntegrityError as e:
+            raise integrity_error(
+                e, f"{DUPLICATE_LIQUOR_DETAIL}; use /licores/upsert para actualizar el catálogo"
+            )
+        except SQLAlchemyError as e:
+            logger.error(f"Error de base de datos en la carga masiva: {e}")
+            raise HTTPException(status_code=500, detail=f"Error de base de datos: {e}")
+    results.extend(
+        schemas.BulkItemResult(index=index, status="created", id=liquor_id)
+        for (index, _), liquor_id in zip(valid, ids)
+    )
+    results.sort(key=lambda result: result.index)
+    return schemas.BulkLiquorResult(created=len(ids), failed=total - len(ids), results=results)
+
+@app.post(
+    "/licores/upsert",
+    response_model=schemas.UpsertLiquorResult,
+    tags=["Licores"],
+    openapi_extra=BULK_OPENAPI
+)
+async def upsert_liquors(
+    body: tuple = Depends(read_liquor_rows),
+    db: AsyncSession = Depends(get_write_db)
+):
+    """
+    Aplicar el catálogo completo de un proveedor (mismo cuerpo que /licores/bulk)
+    - Cada licor se identifica por marca, nombre y volumen: los nuevos se
+      insertan y los existentes se actualizan solo si cambió la descripción,
+      categoría, precio, graduación o proveedor
+    - El stock, la disponibilidad y el stock mínimo solo se usan al insertar
+    - Si una clave se repite en la petición gana la última aparición; las
+      anteriores se reportan en errors
+    """
+    total, valid, errors = body
+    logger.info(f"Recibido catálogo de {total} licores")
+
+    latest = {}
+    for index, liquor in valid:
+        key = (liquor.brand, liquor.name, liquor.volume_ml)
+        if key in latest:
+            errors.append(schemas.BulkItemResult(
+                index=latest[key][0], status="error",
+                error=f"Clave repetida en la fila {index}: marca, nombre y volumen"
+            ))
+        latest[key] = (index, liquor)
+
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    if latest:
+        try:
+            counts = await crud.upsert_liquors(
+                db, [liquor for _, liquor in latest.values()], batch_size=BULK_BATCH_SIZE
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=501, detail=str(e))
+        except SQLAlchemyError as e:
+            logger.error(f"Error de base de datos al aplicar el catálogo: {e}")
+            raise HTTPException(status_code=500, detail=f"Error de base de datos: {e}")
+    errors.sort(key=lambda result: result.index)
+    return schemas.UpsertLiquorResult(**counts, failed=len(errors), errors=errors)
+
 @app.get("/licores/", response_model=List[schemas.Liquor], tags=["Licores"])
-def read_liquors(
+async def read_liquors(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     category: Optional[models.LiquorCategory] = None,
-    db: Session = Depends(get_db)
+    sort_by: schemas.LiquorSortField = schemas.LiquorSortField.ID,
+    order: str = Query("asc", regex="^(asc|desc)$"),
+    ranges: schemas.LiquorRanges = Depends(liquor_ranges),
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Obtener lista de licores con filtros opcionales
-    - **skip**: Número de registros a saltar (paginación)
+    - **skip**: Número de registros a saltar (paginación por offset)
     - **limit**: Número máximo de registros a retornar
+    - **cursor**: Cursor de la página siguiente (cabecera X-Next-Cursor);
+      si se envía se ignora skip. Debe usarse con el mismo sort_by y order
+      (otro ordenamiento responde 400)
     - **category**: Filtrar por categoría
+    - **sort_by**: Ordenar por id, price, name, stock o updated_at
+    - **order**: Orden ascendente (asc) o descendente (desc)
+    - **min_price**/**max_price**, **min_alcohol_content**/**max_alcohol_content**,
+      **min_volume_ml**/**max_volume_ml**, **min_stock**/**max_stock**:
+      Filtros por rango (límites inclusivos), combinables con category y el cursor
+    - **fields**: Campos a retornar separados por comas (p. ej. id,name,price,stock);
+      el ID se incluye siempre y solo se leen esas columnas
+
+    Soporta If-None-Match: retorna 304, sin consultar la página, si el
+    catálogo no cambió desde que se obtuvo el ETag
     """
     try:
-        if category:
-            logger.info(f"Buscando licores por categoría: {category}")
-            liquors = crud.get_liquors_by_category(db, category)
-        else:
-            logger.info(f"Obteniendo lista de licores (skip={skip}, limit={limit})")
-            liquors = crud.get_liquors(db, skip=skip, limit=limit)
+        logger.info(
+            f"Obteniendo lista de licores (skip={skip}, limit={limit}, cursor={cursor}, "
+            f"category={category}, sort_by={sort_by.value}, order={order}, ranges={ranges}, "
+            f"fields={fields})"
+        )
+        selected = requested_fields(schemas.Liquor, fields)
+        # La versión se lee antes que la página: si un licor cambia entre ambas
+        # lecturas, el ETag es el anterior y la siguiente revalidación no coincide
+        etag = listing_etag(await crud.get_catalog_version_cached(db), request.url.query)
+        cached = not_modified(request, response, etag)
+        if cached is not None:
+            return cached
+        # El cursor usa la clave de ordenamiento: se lee aunque no se pida y se
+        # omite al serializar
+        loaded = selected and schemas.with_fields(schemas.Liquor, selected, sort_by.value)
+        liquors = await crud.get_liquors_cached(
+            db,
+            skip=skip,
+            limit=limit,
+            after=cursor_values(cursor, sort_by.value, order),
+            category=category,
+            sort_by=sort_by.value,
+            descending=order == "desc",
+            ranges=ranges,
+            fields=loaded
+        )
+        set_next_cursor(response, liquors, limit, sort_by=sort_by.value, order=order)
         logger.info(f"Se encontraron {len(liquors)} licores")
-        return liquors
+        return json_response(
+            schemas.list_adapter(schemas.Liquor, loaded).dump_json(
+                liquors, include=selected and {"__all__": set(selected)}
+            ),
+            response
+        )
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error al obtener licores: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get(
+    "/licores/export",
+    response_class=StreamingResponse,
+    tags=["Licores"],
+    responses=EXPORT_RESPONSES
+)
+async def export_liquors(
+    format: str = Query("ndjson", regex="^(ndjson|csv)$"),
+    category: Optional[models.LiquorCategory] = None,
+    ranges: schemas.LiquorRanges = Depends(liquor_ranges),
+    fields: Optional[str] = None
+):
+    """
+    Exportar el catálogo completo en orden de ID (sincronización nocturna)
+    - **format**: ndjson (un licor por línea, mismos campos que GET /licores/) o csv
+    - **category**, filtros por rango y **fields**: los mismos que GET /licores/
+
+    Se envía a medida que se lee la base de datos (cursor del lado del
+    servidor): la memoria usada no depende del tamaño del catálogo
+    """
+    selected = requested_fields(schemas.Liquor, fields)
+    await check_schema()
+    logger.info(
+        f"Exportando licores (format={format}, category={category}, ranges={ranges}, "
+        f"fields={fields})"
+    )
+    statement = crud.liquor_export_statement(category=category, ranges=ranges, fields=selected)
+    return StreamingResponse(
+        export_rows(statement, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="licores.{format}"'}
+    )
+
+@app.get("/licores/search", response_model=List[schemas.Liquor], tags=["Licores"])
+async def search_liquors(
+    q: str = Query(..., min_length=1, description="Texto a buscar"),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Buscar licores por nombre, marca, descripción o proveedor
+    - **q**: Palabras a buscar (todas deben aparecer; la última admite prefijo)
+    - **limit**: Número máximo de resultados, ordenados por relevancia
+    """
+    try:
+        return await crud.search_liquors(db, q=q, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/licores/facets", response_model=schemas.LiquorFacets, tags=["Licores"])
+async def read_facets(
+    q: Optional[str] = Query(None, description="Texto a buscar (como en /licores/search)"),
+    category: Optional[models.LiquorCategory] = None,
+    brand: Optional[str] = None,
+    supplier: Optional[str] = None,
+    facet_limit: int = Query(20, ge=1, le=500),
+    ranges: schemas.LiquorRanges = Depends(liquor_ranges),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Conteos por categoría, marca, proveedor, rango de precio y rango de
+    graduación para la barra de filtros, en una sola consulta
+    - **q**, **category**, **brand**, **supplier** y los filtros por rango
+      (min_price, max_price, ...): Filtros aplicados. Los conteos de una
+      faceta ignoran su propio filtro, para mostrar las alternativas
+    - **facet_limit**: Máximo de valores por faceta (categoría, marca y proveedor)
+    """
+    try:
+        return await crud.get_facets_cached(
+            db, q=q, category=category, brand=brand, supplier=supplier,
+            ranges=ranges, facet_limit=facet_limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/licores/fuzzy", response_model=List[schemas.Liquor], tags=["Licores"])
+async def fuzzy_search_liquors(
+    q: str = Query(..., min_length=1, description="Nombre o marca, aunque tenga errores"),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Búsqueda aproximada por nombre y marca, tolerante a errores de escritura
+    - **q**: Texto a buscar ("jonnie walker" encuentra "Johnnie Walker")
+    - **limit**: Número máximo de resultados, ordenados por similitud
+    """
+    try:
+        return await crud.fuzzy_search_liquors(db, q=q, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/licores/autocomplete", response_model=List[schemas.LiquorSuggestion], tags=["Licores"])
+async def autocomplete_liquors(
+    prefix: str = Query(..., min_length=1, description="Texto escrito hasta el momento"),
+    limit: int = Query(10, ge=1, le=50)
+):
+    """
+    Sugerencias para el buscador mientras se escribe, servidas desde un
+    índice en memoria (sin consultar la base de datos)
+    - **prefix**: Inicio del nombre, de la marca o de una palabra del nombre
+    - **limit**: Número máximo de sugerencias
+    """
+    try:
+        await autocomplete_index.ensure_ready()
+    except SQLAlchemyError as e:
+        logger.error(f"Error al construir el índice de autocompletado: {str(e)}")
+        raise HTTPException(status_code=503, detail="Índice de autocompletado no disponible")
+    return autocomplete_index.suggest(prefix, limit)
+
 @app.get("/licores/{liquor_id}", response_model=schemas.Liquor, tags=["Licores"])
-def read_liquor(liquor_id: int, db: Session = Depends(get_db)):
+async def read_liquor(
+    liquor_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db)
+):
     """
     Obtener un licor por su ID
+    Soporta If-None-Match: retorna 304 si el licor no cambió
     """
-    db_liquor = crud.get_liquor(db, liquor_id=liquor_id)
+    db_liquor = await crud.get_liquor_cached(db, liquor_id=liquor_id)
     if db_liquor is None:
         raise HTTPException(status_code=404, detail="Licor no encontrado")
-    return db_liquor
+    return not_modified(request, response, catalog_etag([db_liquor])) or db_liquor
 
 @app.put("/licores/{liquor_id}", response_model=schemas.Liquor, tags=["Licores"])
-def update_liquor(
+async def update_liquor(
     liquor_id: int,
     liquor_data: schemas.LiquorUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_write_db)
 ):
     """
     Actualizar un licor existente
     """
-    db_liquor = crud.update_liquor(db, liquor_id=liquor_id, liquor_data=liquor_data)
+    try:
+        db_liquor = await crud.update_liquor(db, liquor_id=liquor_id, liquor_data=liquor_data)
+    except IntegrityError as e:
+        raise integrity_error(e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if db_liquor is None:
         raise HTTPException(status_code=404, detail="Licor no encontrado")
     return db_liquor
 
 @app.delete("/licores/{liquor_id}", response_model=schemas.Liquor, tags=["Licores"])
-def delete_liquor(liquor_id: int, db: Session = Depends(get_db)):
+async def delete_liquor(liquor_id: int, db: AsyncSession = Depends(get_write_db)):
     """
     Eliminar un licor
     """
-    db_liquor = crud.delete_liquor(db, liquor_id=liquor_id)
+    db_liquor = await crud.delete_liquor(db, liquor_id=liquor_id)
     if db_liquor is None:
         raise HTTPException(status_code=404, detail="Licor no encontrado")
     return db_liquor
@@ -146,51 +654,179 @@ def delete_liquor(liquor_id: int, db: Session = Depends(get_db)):
 #############################################
 
 @app.post("/ventas/", response_model=schemas.Sale, tags=["Ventas"])
-def create_sale(sale: schemas.SaleCreate, db: Session = Depends(get_db)):
+async def create_sale(sale: schemas.SaleCreate, db: AsyncSession = Depends(get_write_db)):
     """
     Crear una nueva venta
     - Registra la venta
     - Actualiza el inventario
     - Crea las líneas de venta
     """
-    return crud.create_sale(db=db, sale=sale)
+    try:
+        return await crud.create_sale(db=db, sale=sale)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SQLAlchemyError as e:
+        logger.error(f"Error de base de datos al crear venta: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Error interno del servidor al crear la venta"
+        )
+
+# Importación de ventas históricas: lector de registros según el Content-Type
+SALES_IMPORT_READERS = {
+    **{media_type: ndjson_records for media_type in NDJSON_MEDIA_TYPES},
+    "text/csv": csv_records,
+}
+
+SALES_IMPORT_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/x-ndjson": {
+                "schema": {"type": "string", "description": "Un SaleImport en JSON por línea"}
+            },
+            "text/csv": {
+                "schema": {"type": "string", "description": "Mismas columnas que GET /ventas/export?format=csv"}
+            },
+        },
+    }
+}
+
+@app.post(
+    "/ventas/import",
+    response_model=schemas.SaleImportResult,
+    tags=["Ventas"],
+    openapi_extra=SALES_IMPORT_OPENAPI
+)
+async def import_sales(
+    request: Request,
+    apply_stock: bool = True,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Importar ventas históricas (migración desde otro punto de venta)
+    - Cuerpo: NDJSON (una venta por línea, con sale_date y opcionalmente status)
+      o CSV (text/csv) con las columnas de GET /ventas/export?format=csv
+    - **apply_stock**: Descontar del inventario las cantidades vendidas
+      (una vez por licor en cada lote)
+
+    El archivo se procesa a medida que llega, por lotes; las ventas inválidas
+    se omiten y se reportan. Cada lote (ventas y stock) se confirma en su
+    propia transacción: ante un error, los lotes anteriores quedan importados
+    (lo indica el detalle). Las ventas ya importadas se omiten (skipped), así
+    que un archivo interrumpido puede enviarse de nuevo completo
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    records = SALES_IMPORT_READERS.get(content_type)
+    if records is None:
+        raise HTTPException(
+            status_code=415,
+            detail="El cuerpo debe ser NDJSON (application/x-ndjson) o CSV (text/csv)"
+        )
+    importer = SaleImporter(db, apply_stock=apply_stock)
+    try:
+        return await importer.run(records(request.stream()))
+    except SQLAlchemyError as e:
+        logger.error(f"Error de base de datos en la importación de ventas: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error de base de datos tras confirmar {importer.sales} ventas: {e}"
+        )
 
 @app.get("/ventas/", response_model=List[schemas.Sale], tags=["Ventas"])
-def read_sales(
+async def read_sales(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     customer_id: Optional[str] = None,
-    db: Session = Depends(get_db)
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Obtener lista de ventas
+    - **cursor**: Cursor de la página siguiente (cabecera X-Next-Cursor);
+      si se envía se ignora skip
     - **customer_id**: Filtrar por ID de cliente (opcional)
+    - **fields**: Campos a retornar separados por comas (p. ej. id,sale_date,total);
+      el ID se incluye siempre y las líneas solo se consultan si se pide sale_lines
     """
+    selected = requested_fields(schemas.Sale, fields)
     if customer_id:
-        return crud.get_sales_by_customer(db, customer_id)
-    return crud.get_sales(db, skip=skip, limit=limit)
+        sales = await crud.get_sales_by_customer(db, customer_id, fields=selected)
+    else:
+        sales = await crud.get_sales(
+            db, skip=skip, limit=limit, after_id=cursor_after_id(cursor), fields=selected
+        )
+        set_next_cursor(response, sales, limit)
+    return json_response(schemas.list_adapter(schemas.Sale, selected).dump_json(sales), response)
+
+@app.get(
+    "/ventas/export",
+    response_class=StreamingResponse,
+    tags=["Ventas"],
+    responses=EXPORT_RESPONSES
+)
+async def export_sales(
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    format: str = Query("ndjson", regex="^(ndjson|csv)$"),
+    fields: Optional[str] = None
+):
+    """
+    Exportar las ventas de un período con sus líneas (conciliación de fin de mes)
+    - **from**: Fecha inicial, inclusive (p. ej. 2024-05-01)
+    - **to**: Fecha final, exclusiva (p. ej. 2024-06-01)
+    - **format**: ndjson (una venta por línea con sus sale_lines, como GET /ventas/)
+      o csv (una fila por línea de venta con los datos de la venta repetidos)
+    - **fields**: Campos de la venta, como en GET /ventas/; sin sale_lines se
+      exporta una fila por venta
+
+    Se envía a medida que se lee la base de datos (un solo JOIN ordenado con un
+    cursor del lado del servidor): la memoria usada no depende del período
+    """
+    if date_from is not None and date_to is not None and date_from >= date_to:
+        raise HTTPException(status_code=400, detail="'from' debe ser anterior a 'to'")
+    selected = requested_fields(schemas.Sale, fields)
+    await check_schema()
+    logger.info(
+        f"Exportando ventas (from={date_from}, to={date_to}, format={format}, fields={fields})"
+    )
+    statement = crud.sale_export_statement(date_from=date_from, date_to=date_to, fields=selected)
+    if crud.include_sale_lines(selected):
+        rows = export_nested(
+            statement, parent_size=len(crud.selected_columns(crud.SALE_COLUMNS, selected)),
+            children="sale_lines", export_format=format
+        )
+    else:
+        rows = export_rows(statement, format)
+    return StreamingResponse(
+        rows,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="ventas.{format}"'}
+    )
 
 @app.get("/ventas/{sale_id}", response_model=schemas.Sale, tags=["Ventas"])
-def read_sale(sale_id: int, db: Session = Depends(get_db)):
+async def read_sale(sale_id: int, db: AsyncSession = Depends(get_db)):
     """
     Obtener una venta por su ID
     """
-    db_sale = crud.get_sale(db, sale_id=sale_id)
+    db_sale = await crud.get_sale(db, sale_id=sale_id)
     if db_sale is None:
         raise HTTPException(status_code=404, detail="Venta no encontrada")
     return db_sale
 
 @app.put("/ventas/{sale_id}/status", response_model=schemas.Sale, tags=["Ventas"])
-def update_sale_status(
+async def update_sale_status(
     sale_id: int,
     status: str = Query(..., regex="^(completed|cancelled|pending)$"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_write_db)
 ):
     """
     Actualizar el estado de una venta
     - **status**: Nuevo estado (completed, cancelled, pending)
     """
-    db_sale = crud.update_sale_status(db, sale_id=sale_id, status=status)
+    db_sale = await crud.update_sale_status(db, sale_id=sale_id, status=status)
     if db_sale is None:
         raise HTTPException(status_code=404, detail="Venta no encontrada")
     return db_sale
@@ -200,27 +836,65 @@ def update_sale_status(
 #############################################
 
 @app.get("/inventario/bajo-stock", response_model=List[schemas.Liquor], tags=["Inventario"])
-def check_low_stock(db: Session = Depends(get_db)):
+async def check_low_stock(db: AsyncSession = Depends(get_db)):
     """
     Obtener lista de licores con stock bajo
     """
-    return crud.check_low_stock(db)
+    return await crud.check_low_stock(db)
 
 @app.put("/inventario/{liquor_id}/stock", response_model=schemas.Liquor, tags=["Inventario"])
-def update_stock(
+async def update_stock(
     liquor_id: int,
     quantity: int = Query(..., description="Cantidad a agregar (positivo) o restar (negativo)"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_write_db)
 ):
     """
     Actualizar el stock de un licor
-    - **quantity**: Cantidad a agregar (positivo) o restar (negativo)
+    - **quantity**: Cantidad a agregar (positivo) o restar (negativo); si el
+      stock no alcanza para restarla se responde 400 y no se modifica
     """
-    db_liquor = crud.update_stock(db, liquor_id=liquor_id, quantity=quantity)
+    try:
+        db_liquor = await crud.update_stock(db, liquor_id=liquor_id, quantity=quantity)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if db_liquor is None:
         raise HTTPException(status_code=404, detail="Licor no encontrado")
     return db_liquor
 
+#############################################
+# ENDPOINTS DE DIAGNÓSTICO
+#############################################
+
+@app.get("/diagnostico/pool", response_model=schemas.PoolStatus, tags=["Diagnóstico"])
+async def read_pool_status():
+    """
+    Obtener el estado del pool de conexiones del worker que atiende la petición
+    (solo ese worker: el total está en /diagnostico/pool/workers)
+    - **pid**: Proceso del worker que respondió
+    - **checked_out** / **idle** / **overflow**: Conexiones en uso, libres y adicionales
+    - **avg_wait_ms** / **max_wait_ms**: Espera para obtener una conexión
+    """
+    return pool_status()
+
+@app.get("/diagnostico/pool/workers", response_model=List[schemas.PoolStatus], tags=["Diagnóstico"])
+async def read_workers_pool_status():
+    """
+    Obtener el estado del pool de conexiones de cada worker de la máquina
+    - Cada worker publica sus contadores en un archivo compartido (POOL_STATS_PATH)
+    - Sin fcntl (Windows) solo se incluye el worker que atiende la petición
+    """
+    return workers_pool_status()
+
+@app.get("/diagnostico/cache", response_model=schemas.CacheStats, tags=["Diagnóstico"])
+async def read_cache_stats():
+    """
+    Obtener los contadores de la caché de licores del worker que atiende la petición
+    - **hits** / **misses**: Lecturas servidas desde la caché o desde la base de datos
+    - **evictions** / **expirations** / **invalidations**: Entradas desalojadas,
+      vencidas por TTL o invalidadas por escrituras
+    """
+    return liquor_cache.stats()
+
 # Middleware para CORS
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -230,4 +904,5 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Permite todos los métodos
     allow_headers=["*"],  # Permite todos los headers
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],  # Permite leer estas cabeceras desde el navegador
 )
@@ -1,5 +1,5 @@
 # Importamos los tipos de columnas necesarios de SQLAlchemy
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Enum, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 # Importamos la clase Base desde nuestro módulo de base de datos
@@ -41,16 +41,39 @@ class Liquor(Base):
     # Relación con las líneas de venta
     sale_lines = relationship("SaleLine", back_populates="liquor")
 
+    __table_args__ = (
+        # Índice de expresión para la consulta de stock bajo (stock - minimum_stock <= 0)
+        Index("ix_liquors_low_stock", stock - minimum_stock),
+        # Índices compuestos para el listado ordenado y paginado, con y sin categoría
+        Index("ix_liquors_price_id", price, id),
+        Index("ix_liquors_name_id", name, id),
+        Index("ix_liquors_stock_id", stock, id),
+        Index("ix_liquors_updated_at_id", updated_at, id),
+        Index("ix_liquors_category_id", category, id),
+        Index("ix_liquors_category_price_id", category, price, id),
+        Index("ix_liquors_category_name_id", category, name, id),
+        Index("ix_liquors_category_stock_id", category, stock, id),
+        Index("ix_liquors_category_updated_at_id", category, updated_at, id),
+        # Clave natural para la actualización masiva de catálogos de proveedores
+        # (ON CONFLICT); también sirve a los filtros y conteos por marca (facetas)
+        Index("ix_liquors_brand_name_volume_ml", brand, name, volume_ml, unique=True),
+        # Índice para el filtro y conteo por proveedor (facetas)
+        Index("ix_liquors_supplier", supplier),
+        # Índices para los filtros por rango (el de precio y stock ya existen)
+        Index("ix_liquors_alcohol_content_id", alcohol_content, id),
+        Index("ix_liquors_volume_ml_id", volume_ml, id),
+    )
+
 # Modelo para las ventas
 class Sale(Base):
     __tablename__ = "sales"
 
     id = Column(Integer, primary_key=True, index=True)
     customer_name = Column(String(100), nullable=False)
-    customer_id = Column(String(50))  # Documento de identidad
+    customer_id = Column(String(50), index=True)  # Documento de identidad
     total = Column(Float, nullable=False)
     payment_method = Column(String(50), nullable=False)
-    sale_date = Column(DateTime, default=datetime.utcnow)
+    sale_date = Column(DateTime, default=datetime.utcnow, index=True)
     status = Column(String(20), default="completed")  # completed, cancelled, pending
 
     # Relación con las líneas de venta
@@ -61,12 +84,20 @@ class SaleLine(Base):
     __tablename__ = "sale_lines"
 
     id = Column(Integer, primary_key=True, index=True)
-    sale_id = Column(Integer, ForeignKey("sales.id"), nullable=False)
-    liquor_id = Column(Integer, ForeignKey("liquors.id"), nullable=False)
+    sale_id = Column(Integer, ForeignKey("sales.id"), nullable=False, index=True)
+    liquor_id = Column(Integer, ForeignKey("liquors.id"), nullable=False, index=True)
     quantity = Column(Integer, nullable=False)
     unit_price = Column(Float, nullable=False)
     subtotal = Column(Float, nullable=False)
 
     # Relaciones
     sale = relationship("Sale", back_populates="sale_lines")
-    liquor = relationship("Liquor", back_populates="sale_lines")
\ No newline at end of file
+    liquor = relationship("Liquor", back_populates="sale_lines")
+
+# Huella de cada venta creada por la importación masiva: si el mismo archivo
+# (o una parte) se importa de nuevo, sus ventas se omiten en lugar de duplicarse
+class ImportedSale(Base):
+    __tablename__ = "imported_sales"
+
+    digest = Column(String(64), primary_key=True)  # SHA-256 de la venta importada
+    sale_id = Column(Integer, ForeignKey("sales.id"), nullable=False)
\ No newline at end of file
@@ -0,0 +1,42 @@
+# Utilidades para la paginación por cursor (keyset)
+import base64
+import json
+from typing import Any, List
+
+
+def encode_cursor(values: List[Any], sort_by: str = "id", order: str = "asc") -> str:
+    """
+    Codifica la clave de la última fila de una página en un cursor opaco
+    Args:
+        values: Valores de la clave de ordenamiento, p. ej. [id] o [sort_key, id]
+        sort_by, order: Ordenamiento de la página; el cursor solo sirve para él
+    Returns:
+        Cursor en base64 apto para URLs
+    """
+    payload = {"sort_by": sort_by, "order": order, "key": values}
+    raw = json.dumps(payload, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str = "id", order: str = "asc") -> List[Any]:
+    """
+    Decodifica un cursor generado por encode_cursor y retorna su clave
+    Lanza ValueError si el cursor no es válido o se generó con otro sort_by u order
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Cursor inválido: {cursor}") from e
+    if (
+        not isinstance(payload, dict)
+        or not isinstance(payload.get("key"), list)
+        or not payload["key"]
+    ):
+        raise ValueError(f"Cursor inválido: {cursor}")
+    if (payload.get("sort_by"), payload.get("order")) != (sort_by, order):
+        raise ValueError(
+            f"El cursor corresponde a sort_by={payload.get('sort_by')} y "
+            f"order={payload.get('order')}; repita el mismo ordenamiento"
+        )
+    return payload["key"]
@@ -0,0 +1,247 @@
+# Importación masiva de ventas históricas (migración desde otro punto de venta)
+# Lee el archivo por streaming en el mismo formato que GET /ventas/export:
+# NDJSON (una venta por línea con sus sale_lines) o CSV (una fila por línea de venta)
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+import logging
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import crud, models, schemas
+from .cache import invalidate_liquors
+from .database import SessionLocal, engine, serialized_write
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Ventas validadas e insertadas por lote y máximo de errores detallados en el resultado
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "100"))
+
+sale_import_adapter = TypeAdapter(schemas.SaleImport)
+SALE_LINE_FIELDS = tuple(schemas.SaleLine.model_fields)
+
+# Registro leído del archivo: (línea, datos de la venta o None, error o None)
+Record = Tuple[int, Optional[dict], Optional[str]]
+
+
+async def read_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, bytes]]:
+    """Líneas no vacías de un cuerpo recibido por partes, con su número (desde 1)"""
+    pending = b""
+    number = 0
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            number += 1
+            if line.strip():
+                yield number, line
+    if pending.strip():
+        yield number + 1, pending
+
+
+async def ndjson_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Record]:
+    """Una venta (objeto JSON) por línea"""
+    async for number, line in read_lines(chunks):
+        try:
+            data = json.loads(line)
+        except ValueError:
+            yield number, None, "JSON inválido"
+            continue
+        if not isinstance(data, dict):
+            yield number, None, "Cada línea debe ser un objeto JSON"
+            continue
+        yield number, data, None
+
+
+async def csv_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Record]:
+    """
+    CSV con encabezado, una fila por línea de venta. Las filas seguidas con el
+    mismo valor en la columna id forman una venta (sin columna id, cada fila
+    es una venta). Los campos vacíos se toman como nulos y no se admiten
+    saltos de línea dentro de un campo
+    """
+    header = None
+    sale, sale_id, sale_number = None, None, 0
+    async for number, line in read_lines(chunks):
+        try:
+            values = next(csv.reader([line.decode("utf-8")]))
+        except (UnicodeDecodeError, csv.Error, StopIteration):
+            yield number, None, "Fila CSV inválida"
+            continue
+        if header is None:
+            header = values
+            continue
+        if len(values) != len(header):
+            yield number, None, f"Se esperaban {len(header)} columnas y hay {len(values)}"
+            continue
+        row = {name: value if value != "" else None for name, value in zip(header, values)}
+        if sale is None or "id" not in row or row["id"] != sale_id:
+            if sale is not None:
+                yield sale_number, sale, None
+            sale = {name: value for name, value in row.items() if name not in SALE_LINE_FIELDS}
+            sale["sale_lines"] = []
+            sale_id, sale_number = row.get("id"), number
+        if row.get("liquor_id") is not None:
+            sale["sale_lines"].append({name: row.get(name) for name in SALE_LINE_FIELDS})
+    if sale is not None:
+        yield sale_number, sale, None
+
+
+def sale_digest(sale: schemas.SaleImport) -> str:
+    """
+    Huella de una venta importada (models.ImportedSale): la misma venta da la
+    misma huella, venga de NDJSON o de CSV
+    """
+    return hashlib.sha256(sale.model_dump_json().encode()).hexdigest()
+
+
+class SaleImporter:
+    """
+    Importa ventas por lotes de IMPORT_CHUNK_SIZE, con una transacción por
+    lote: cada lote comprueba de una vez que existan sus licores, inserta
+    ventas y líneas con INSERT de varias filas (COPY en PostgreSQL) y descuenta
+    del inventario sus cantidades, una vez por licor. Así el bloqueo de
+    escritura de SQLite se toma lote a lote y, si la importación se
+    interrumpe, cada venta confirmada ya tiene su stock descontado
+    Las ventas que ya se importaron antes (misma huella) se omiten, de modo
+    que un archivo interrumpido puede importarse de nuevo completo
+    """
+    def __init__(self, db: AsyncSession, apply_stock: bool = True):
+        self.db = db
+        self.apply_stock = apply_stock
+        self.known_liquors: Set[int] = set()
+        self.updated_liquors: Set[int] = set()
+        self.sales = 0
+        self.lines = 0
+        self.failed = 0
+        self.skipped = 0
+        self.errors: List[schemas.BulkItemResult] = []
+
+    def reject(self, number: int, error: str):
+        """Cuenta una venta rechazada y guarda el detalle de los primeros errores"""
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append(schemas.BulkItemResult(index=number, status="error", error=error))
+
+    async def flush(self, chunk: List[Tuple[int, str, schemas.SaleImport]]):
+        """
+        Valida contra la base de datos un lote de ventas y, en una transacción,
+        inserta las que no se habían importado y descuenta su stock
+        """
+        referenced = {line.liquor_id for _, _, sale in chunk for line in sale.sale_lines}
+        unknown = referenced - self.known_liquors
+        if unknown:
+            self.known_liquors.update(await self.db.scalars(
+                select(models.Liquor.id).where(models.Liquor.id.in_(unknown))
+            ))
+        valid = {}
+        for number, digest, sale in chunk:
+            missing = sorted({line.liquor_id for line in sale.sale_lines} - self.known_liquors)
+            if missing:
+                self.reject(number, f"Licores no encontrados: {missing}")
+            elif digest in valid:
+                # Una venta repetida dentro del archivo también se importa una sola vez
+                self.skipped += 1
+            else:
+                valid[digest] = sale
+        if not valid:
+            return
+        async with serialized_write():
+            imported = await crud.imported_sale_digests(self.db, list(valid))
+            sales = {digest: sale for digest, sale in valid.items() if digest not in imported}
+            quantities: Dict[int, int] = {}
+            for sale in sales.values():
+                for line in sale.sale_lines:
+                    quantities[line.liquor_id] = quantities.get(line.liquor_id, 0) + line.quantity
+            lines = 0
+            if sales:
+                lines = await crud.insert_sales_batch(self.db, list(sales.values()), list(sales))
+                if self.apply_stock and quantities:
+                    await crud.apply_sold_quantities(self.db, quantities)
+                await self.db.commit()
+        self.sales += len(sales)
+        self.lines += lines
+        self.skipped += len(imported)
+        if self.apply_stock and quantities:
+            self.updated_liquors.update(quantities)
+            invalidate_liquors(*quantities)
+
+    async def run(self, records: AsyncIterator[Record]) -> schemas.SaleImportResult:
+        """
+        Importa todos los registros. Ante un error (o si la tarea se cancela) se
+        descarta el lote en curso; los anteriores quedan confirmados (self.sales)
+        """
+        started = time.perf_counter()
+        try:
+            chunk = []
+            async for number, data, error in records:
+                if error is not None:
+                    self.reject(number, error)
+                    continue
+                try:
+                    sale = sale_import_adapter.validate_python(data)
+                except ValidationError as e:
+                    self.reject(number, schemas.validation_message(e))
+                    continue
+                chunk.append((number, sale_digest(sale), sale))
+                if len(chunk) >= IMPORT_CHUNK_SIZE:
+                    await self.flush(chunk)
+                    chunk = []
+            if chunk:
+                await self.flush(chunk)
+        except Exception as e:
+            logger.error(f"Error en la importación de ventas tras confirmar {self.sales} ventas: {str(e)}")
+            await self.db.rollback()
+            raise
+        seconds = time.perf_counter() - started
+        rows_per_second = (self.sales + self.lines) / seconds if seconds else 0.0
+        logger.info(
+            f"Ventas importadas: {self.sales} ventas, {self.lines} líneas, {self.failed} rechazadas, "
+            f"{self.skipped} ya importadas en {seconds:.1f} s ({rows_per_second:.0f} filas/s)"
+        )
+        return schemas.SaleImportResult(
+            sales=self.sales,
+            lines=self.lines,
+            failed=self.failed,
+            skipped=self.skipped,
+            errors=sorted(self.errors, key=lambda result: result.index),
+            liquors_updated=len(self.updated_liquors),
+            seconds=round(seconds, 3),
+            rows_per_second=round(rows_per_second, 1)
+        )
+
+
+async def read_file(path: str, block_size: int = 1 << 20) -> AsyncIterator[bytes]:
+    """Contenido de un archivo por bloques"""
+    with open(path, "rb") as file:
+        while block := file.read(block_size):
+            yield block
+
+
+async def main(path: str, apply_stock: bool = True):
+    """
+    Importa un archivo desde la línea de comandos:
+    python -m app.sales_import ventas.ndjson|ventas.csv [--sin-stock]
+    """
+    records = csv_records if path.lower().endswith(".csv") else ndjson_records
+    try:
+        async with SessionLocal() as db:
+            result = await SaleImporter(db, apply_stock=apply_stock).run(records(read_file(path)))
+        print(result.model_dump_json(indent=2))
+    finally:
+        await engine.dispose()
+
+if __name__ == "__main__":
+    # Igual que app.database: se usa el módulo importado para compartir la misma Base
+    from app import sales_import
+    arguments = [argument for argument in sys.argv[1:] if argument != "--sin-stock"]
+    if len(arguments) != 1:
+        sys.exit("Uso: python -m app.sales_import ARCHIVO.ndjson|ARCHIVO.csv [--sin-stock]")
+    asyncio.run(sales_import.main(arguments[0], apply_stock="--sin-stock" not in sys.argv))
@@ -1,9 +1,17 @@
 # Importamos las clases necesarias de Pydantic
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, create_model, model_validator
+from typing import Optional, Tuple
+from functools import lru_cache
 from datetime import datetime
 from enum import Enum
 
+def validation_message(error: ValidationError) -> str:
+    """Mensaje legible de un error de validación: "campo: motivo; ..." """
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" if item["loc"] else item["msg"]
+        for item in error.errors()
+    )
+
 # Enumeración para las categorías de licores
 class LiquorCategory(str, Enum):
     WHISKEY = "whiskey"
@@ -15,6 +23,37 @@ class LiquorCategory(str, Enum):
     CERVEZA = "cerveza"
     OTRO = "otro"
 
+# Campos por los que se puede ordenar el listado de licores
+class LiquorSortField(str, Enum):
+    ID = "id"
+    PRICE = "price"
+    NAME = "name"
+    STOCK = "stock"
+    UPDATED_AT = "updated_at"
+
+# Filtros por rango del catálogo (límites inclusivos, None = sin límite)
+class LiquorRanges(BaseModel):
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    min_alcohol_content: Optional[float] = None
+    max_alcohol_content: Optional[float] = None
+    min_volume_ml: Optional[int] = None
+    max_volume_ml: Optional[int] = None
+    min_stock: Optional[int] = None
+    max_stock: Optional[int] = None
+
+    class Config:
+        # Inmutable (y hashable) para poder formar parte de la clave de la caché
+        frozen = True
+
+    @model_validator(mode="after")
+    def check_bounds(self):
+        for column in ("price", "alcohol_content", "volume_ml", "stock"):
+            low, high = getattr(self, f"min_{column}"), getattr(self, f"max_{column}")
+            if low is not None and high is not None and low > high:
+                raise ValueError(f"min_{column} no puede ser mayor que max_{column}")
+        return self
+
 # Esquema base para los licores
 class LiquorBase(BaseModel):
     name: str                    # Nombre del licor
@@ -55,7 +94,48 @@ class Liquor(LiquorBase):
     updated_at: datetime        # Fecha de última actualización
     
     class Config:
-        orm_mode = True
+        from_attributes = True
+
+# Resultado de una fila de la carga masiva de licores
+class BulkItemResult(BaseModel):
+    index: int                  # Posición de la fila en la petición
+    status: str                 # "created" o "error"
+    id: Optional[int] = None    # ID asignado si se creó
+    error: Optional[str] = None # Motivo si no se creó
+
+# Resultado de la carga masiva de licores
+class BulkLiquorResult(BaseModel):
+    created: int
+    failed: int
+    results: list[BulkItemResult]
+
+# Resultado de aplicar el catálogo de un proveedor
+class UpsertLiquorResult(BaseModel):
+    inserted: int               # Licores nuevos
+    updated: int                # Licores existentes con algún cambio
+    unchanged: int              # Licores existentes sin cambios (no se tocaron)
+    failed: int                 # Filas rechazadas
+    errors: list[BulkItemResult]
+
+# Sugerencia del autocompletado de licores
+class LiquorSuggestion(BaseModel):
+    id: int
+    name: str
+    brand: str
+
+# Conteo de licores para un valor de una faceta
+class FacetCount(BaseModel):
+    value: str
+    count: int
+
+# Conteos por faceta para la barra de filtros del catálogo
+class LiquorFacets(BaseModel):
+    total: int                          # Licores que cumplen todos los filtros
+    category: list[FacetCount]
+    brand: list[FacetCount]
+    supplier: list[FacetCount]
+    price: list[FacetCount]             # Rangos de precio ("0-20", "20-50", ...)
+    alcohol_content: list[FacetCount]   # Rangos de graduación ("0-5", "5-15", ...)
 
 # Esquema para ventas de licores
 class SaleLine(BaseModel):
@@ -72,6 +152,22 @@ class SaleCreate(BaseModel):
     total: float
     payment_method: str
 
+# Venta histórica para la importación masiva (fecha y estado de origen)
+class SaleImport(SaleCreate):
+    sale_date: datetime
+    status: str = Field("completed", pattern="^(completed|cancelled|pending)$")
+
+# Resultado de la importación masiva de ventas
+class SaleImportResult(BaseModel):
+    sales: int                  # Ventas importadas
+    lines: int                  # Líneas de venta importadas
+    failed: int                 # Ventas rechazadas
+    skipped: int                # Ventas ya importadas antes (se omiten)
+    errors: list[BulkItemResult]  # Primeros errores (index: línea del archivo)
+    liquors_updated: int        # Licores cuyo stock se descontó
+    seconds: float              # Duración de la importación
+    rows_per_second: float      # (ventas + líneas) / segundos
+
 # Esquema para respuesta de ventas
 class Sale(SaleCreate):
     id: int
@@ -79,4 +175,67 @@ class Sale(SaleCreate):
     status: str  # "completed", "cancelled", "pending"
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        from_attributes = True
+
+# Esquema para el estado del pool de conexiones de un worker
+class PoolStatus(BaseModel):
+    pid: int                    # Proceso (worker) que atendió la petición
+    pool_size: int              # Conexiones permanentes del pool
+    checked_out: int            # Conexiones en uso
+    idle: int                   # Conexiones libres en el pool
+    overflow: int               # Conexiones adicionales abiertas sobre pool_size
+    max_overflow: int           # Máximo de conexiones adicionales permitidas
+    checkouts: int              # Conexiones entregadas desde el arranque
+    timeouts: int               # Esperas que superaron pool_timeout
+    avg_wait_ms: float          # Espera promedio por una conexión
+    max_wait_ms: float          # Espera máxima por una conexión
+
+# Esquema para los contadores de la caché de licores de un worker
+class CacheStats(BaseModel):
+    size: int                   # Entradas actuales
+    maxsize: int                # Máximo de entradas (LRU)
+    ttl_seconds: float          # Vigencia de cada entrada
+    hits: int                   # Lecturas servidas desde la caché
+    misses: int                 # Lecturas que fueron a la base de datos
+    evictions: int              # Entradas desalojadas por tamaño
+    expirations: int            # Entradas vencidas por TTL
+    invalidations: int          # Entradas invalidadas por escrituras
+
+# Selección de campos (parámetro fields de los listados y las exportaciones)
+def parse_fields(model: type[BaseModel], value: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """
+    Campos pedidos en el parámetro fields ("id,name,price") en el orden del
+    esquema, siempre con el ID. Retorna None si no se pidió una selección
+    Lanza ValueError si algún campo no existe en el esquema
+    """
+    if not value:
+        return None
+    requested = {name.strip() for name in value.split(",") if name.strip()}
+    unknown = requested - set(model.model_fields)
+    if unknown:
+        raise ValueError(
+            f"Campos desconocidos: {', '.join(sorted(unknown))}. "
+            f"Campos válidos: {', '.join(model.model_fields)}"
+        )
+    return with_fields(model, requested, "id")
+
+def with_fields(model: type[BaseModel], fields, *extra: str) -> Tuple[str, ...]:
+    """Campos de una selección más los indicados, en el orden del esquema"""
+    selected = set(fields) | set(extra)
+    return tuple(name for name in model.model_fields if name in selected)
+
+@lru_cache(maxsize=256)
+def list_adapter(model: type[BaseModel], fields: Optional[Tuple[str, ...]] = None) -> TypeAdapter:
+    """
+    Validador y serializador precompilado de un listado: valida filas
+    (diccionarios) y genera el JSON en una sola llamada, sin pasar por el
+    codificador de FastAPI. Con una selección de campos usa un modelo con
+    solo esos campos (y sus mismas validaciones), creado una vez por selección
+    """
+    if fields is None:
+        return TypeAdapter(list[model])
+    partial = create_model(
+        f"{model.__name__}Fields",
+        **{name: (model.model_fields[name].annotation, model.model_fields[name]) for name in fields}
+    )
+    return TypeAdapter(list[partial])
@@ -0,0 +1,152 @@
+# Búsqueda de texto completo sobre el catálogo de licores
+# SQLite: tabla virtual FTS5 sincronizada con triggers
+# PostgreSQL: índice GIN sobre un tsvector calculado de las columnas de texto
+# Búsqueda aproximada: pg_trgm en PostgreSQL, TrigramIndex en memoria en SQLite
+import re
+from typing import List
+
+from sqlalchemy import column, func, literal, literal_column, select, table, text
+
+from . import models
+
+# Columnas indexadas para la búsqueda
+SEARCH_COLUMNS = ("name", "brand", "description", "supplier")
+
+SQLITE_FTS_TABLE = "liquors_fts"
+
+# Pesos de bm25 por columna: el nombre y la marca pesan más que la descripción
+SQLITE_BM25_WEIGHTS = "10.0, 5.0, 1.0, 2.0"
+
+SQLITE_FTS_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_FTS_TABLE} USING fts5(
+        name, brand, description, supplier,
+        content='liquors', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS liquors_fts_ai AFTER INSERT ON liquors BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, name, brand, description, supplier)
+        VALUES (new.id, new.name, new.brand, new.description, new.supplier);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS liquors_fts_ad AFTER DELETE ON liquors BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, name, brand, description, supplier)
+        VALUES ('delete', old.id, old.name, old.brand, old.description, old.supplier);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS liquors_fts_au
+    AFTER UPDATE OF name, brand, description, supplier ON liquors BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, name, brand, description, supplier)
+        VALUES ('delete', old.id, old.name, old.brand, old.description, old.supplier);
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, name, brand, description, supplier)
+        VALUES (new.id, new.name, new.brand, new.description, new.supplier);
+    END
+    """,
+]
+
+# La expresión debe ser idéntica en el índice y en las consultas para que
+# PostgreSQL use el índice
+POSTGRES_SEARCH_VECTOR = "to_tsvector('simple', " + " || ' ' || ".join(
+    f"coalesce({name}, '')" for name in SEARCH_COLUMNS
+) + ")"
+
+# Texto sobre el que se calcula la similitud por trigramas (nombre y marca)
+POSTGRES_FUZZY_TEXT = "(coalesce(name, '') || ' ' || coalesce(brand, ''))"
+
+POSTGRES_SEARCH_DDL = [
+    f"CREATE INDEX IF NOT EXISTS ix_liquors_search ON liquors USING GIN ({POSTGRES_SEARCH_VECTOR})",
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX IF NOT EXISTS ix_liquors_fuzzy ON liquors USING GIN ({POSTGRES_FUZZY_TEXT} gin_trgm_ops)",
+]
+
+
+def create_search_index(sync_conn):
+    """
+    Crea el índice de búsqueda según el motor de base de datos (idempotente)
+    En SQLite, si la tabla FTS5 es nueva se indexan los licores existentes
+    """
+    dialect = sync_conn.dialect.name
+    if dialect == "sqlite":
+        exists = sync_conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = :name"),
+            {"name": SQLITE_FTS_TABLE}
+        ).first()
+        for statement in SQLITE_FTS_DDL:
+            sync_conn.execute(text(statement))
+        if not exists:
+            sync_conn.execute(text(
+                f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('rebuild')"
+            ))
+    elif dialect == "postgresql":
+        for statement in POSTGRES_SEARCH_DDL:
+            sync_conn.execute(text(statement))
+
+
+def search_terms(q: str) -> List[str]:
+    """
+    Separa la búsqueda en palabras, descartando la sintaxis propia de cada motor
+    """
+    return re.findall(r"\w+", q.lower())
+
+
+def search_condition(dialect: str, terms: List[str]):
+    """
+    Condición WHERE que selecciona los licores que coinciden con la búsqueda
+    Todas las palabras deben aparecer; la última se trata como prefijo
+    """
+    if dialect == "sqlite":
+        match = " ".join(f'"{term}"' for term in terms) + "*"
+        return models.Liquor.id.in_(
+            select(literal_column("rowid"))
+            .select_from(table(SQLITE_FTS_TABLE))
+            .where(text(f"{SQLITE_FTS_TABLE} MATCH :match").bindparams(match=match))
+        )
+    if dialect == "postgresql":
+        tsquery = func.to_tsquery(literal_column("'simple'"), " & ".join(terms) + ":*")
+        return literal_column(POSTGRES_SEARCH_VECTOR).op("@@")(tsquery)
+    raise ValueError(f"Búsqueda no soportada para la base de datos: {dialect}")
+
+
+def search_statement(dialect: str, terms: List[str], limit: int):
+    """
+    Construye la consulta de búsqueda ordenada por relevancia
+    Todas las palabras deben aparecer; la última se trata como prefijo
+    """
+    if dialect == "sqlite":
+        match = " ".join(f'"{term}"' for term in terms) + "*"
+        fts = table(SQLITE_FTS_TABLE, column("rowid"))
+        return (
+            select(models.Liquor)
+            .join(fts, models.Liquor.id == fts.c.rowid)
+            .where(text(f"{SQLITE_FTS_TABLE} MATCH :match").bindparams(match=match))
+            .order_by(text(f"bm25({SQLITE_FTS_TABLE}, {SQLITE_BM25_WEIGHTS})"))
+            .limit(limit)
+        )
+    if dialect == "postgresql":
+        vector = literal_column(POSTGRES_SEARCH_VECTOR)
+        tsquery = func.to_tsquery(literal_column("'simple'"), " & ".join(terms) + ":*")
+        return (
+            select(models.Liquor)
+            .where(search_condition(dialect, terms))
+            .order_by(func.ts_rank(vector, tsquery).desc())
+            .limit(limit)
+        )
+    raise ValueError(f"Búsqueda no soportada para la base de datos: {dialect}")
+
+
+def fuzzy_statement(q: str, limit: int):
+    """
+    Búsqueda aproximada en PostgreSQL: el operador <% de pg_trgm usa el índice
+    ix_liquors_fuzzy y el orden es por word_similarity (mayor primero)
+    """
+    fuzzy_text = literal_column(POSTGRES_FUZZY_TEXT)
+    return (
+        select(models.Liquor)
+        .where(literal(q).op("<%")(fuzzy_text))
+        .order_by(func.word_similarity(q, fuzzy_text).desc(), models.Liquor.id)
+        .limit(limit)
+    )
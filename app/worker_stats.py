@@ -0,0 +1,87 @@
+# Contadores por worker en memoria compartida, visibles desde cualquier worker
+import mmap
+import os
+from typing import Dict, List, Sequence
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueos de registro, cada worker solo se ve a sí mismo
+    fcntl = None
+
+
+class WorkerStatsBoard:
+    """
+    Tabla en memoria compartida (archivo mapeado con mmap) con una fila de
+    contadores por worker de la misma máquina, como cache.GenerationBus.
+    Cada worker reclama una fila la primera vez que publica y la conserva con
+    un bloqueo de registro (fcntl.lockf) sobre sus bytes. El sistema operativo
+    libera el bloqueo cuando el proceso termina: una fila sin bloqueo es de un
+    worker que ya no existe, se omite al leer y puede reutilizarse.
+    """
+    def __init__(self, path: str, fields: Sequence[str], rows: int = 256):
+        self.path = path
+        self.fields = ("pid",) + tuple(fields)
+        self.rows = rows
+        self.row_size = len(self.fields) * 8
+        self.enabled = fcntl is not None
+        self.pid = None
+        self.row = None
+
+    def _claim(self):
+        """Abre el archivo en este proceso y reclama una fila libre"""
+        # El descriptor heredado de un fork no se cierra: cerrar cualquier
+        # descriptor del archivo libera todos los bloqueos del proceso
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = self.rows * self.row_size
+        if os.fstat(self.fd).st_size < size:
+            os.ftruncate(self.fd, size)
+        self.mmap = mmap.mmap(self.fd, size)
+        self.values = memoryview(self.mmap).cast("d")
+        self.pid, self.row = os.getpid(), None
+        for row in range(self.rows):
+            if self._try_lock(row):
+                base = row * len(self.fields)
+                for index in range(len(self.fields)):
+                    self.values[base + index] = 0.0
+                self.values[base] = self.pid
+                self.row = row
+                return
+
+    def _try_lock(self, row: int) -> bool:
+        """Intenta bloquear una fila; False si la tiene otro proceso vivo"""
+        try:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB, self.row_size, row * self.row_size)
+            return True
+        except OSError:
+            return False
+
+    def publish(self, values: Dict[str, float]):
+        """Escribe los contadores de este worker en su fila"""
+        if not self.enabled:
+            return
+        if self.pid != os.getpid():
+            self._claim()
+        if self.row is None:
+            return
+        base = self.row * len(self.fields)
+        for index, field in enumerate(self.fields[1:], start=1):
+            self.values[base + index] = values[field]
+
+    def snapshot(self) -> List[Dict[str, float]]:
+        """Contadores de los workers vivos (incluido este, si ya publicó)"""
+        if not self.enabled:
+            return []
+        if self.pid != os.getpid():
+            self._claim()
+        rows = []
+        for row in range(self.rows):
+            base = row * len(self.fields)
+            if not self.values[base]:
+                continue
+            if row != self.row:
+                if self._try_lock(row):
+                    # Nadie la tenía: es de un worker que terminó
+                    fcntl.lockf(self.fd, fcntl.LOCK_UN, self.row_size, row * self.row_size)
+                    continue
+            rows.append(dict(zip(self.fields, self.values[base:base + len(self.fields)])))
+        return rows
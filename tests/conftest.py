@@ -0,0 +1,170 @@
+# Configuración común de las pruebas
+# Cada sesión usa una base SQLite temporal, inicializada igual que en un
+# despliegue (python -m app.database). Las variables de entorno se fijan
+# antes de importar la aplicación, que crea el motor al importarse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import pytest
+
+TEST_DIR = tempfile.mkdtemp(prefix="licores-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TEST_DIR, 'test.db')}"
+os.environ["LIQUOR_CACHE_BUS_PATH"] = os.path.join(TEST_DIR, "cache.gen")
+os.environ["POOL_STATS_PATH"] = os.path.join(TEST_DIR, "pool.stats")
+
+import httpx
+from sqlalchemy import event
+from app import database
+from app.main import app
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Categorías del catálogo de prueba (una cada tres licores es de ron)
+CATEGORIES = ("ron", "vodka", "whiskey")
+
+
+def liquor_data(number: int, **overrides) -> dict:
+    """Datos de un licor de prueba (LiquorCreate)"""
+    data = {
+        "name": f"Licor {number}",
+        "brand": "Marca",
+        "description": "Licor de prueba",
+        "category": CATEGORIES[number % len(CATEGORIES)],
+        "price": 10.0 + number,
+        "alcohol_content": 40.0,
+        "volume_ml": 750,
+        "stock": 1000,
+        "supplier": "Proveedor",
+    }
+    data.update(overrides)
+    return data
+
+
+@pytest.fixture(scope="session")
+def loop():
+    """Bucle de eventos de la sesión: el pool del motor queda ligado a él"""
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(database.init_db())
+    yield loop
+    loop.run_until_complete(database.engine.dispose())
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def client(loop):
+    """
+    Peticiones a la aplicación en el mismo proceso (sin servidor)
+    Retorna una función síncrona request(method, url, **kwargs)
+    """
+    async_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+    def request(method: str, url: str, **kwargs) -> httpx.Response:
+        return loop.run_until_complete(async_client.request(method, url, **kwargs))
+
+    yield request
+    loop.run_until_complete(async_client.aclose())
+
+
+@pytest.fixture(scope="session")
+def catalog(client):
+    """30 licores; los múltiplos de 5 quedan con stock bajo"""
+    liquors = [
+        liquor_data(number, stock=2 if number % 5 == 0 else 1000)
+        for number in range(30)
+    ]
+    response = client("POST", "/licores/bulk", json=liquors)
+    assert response.status_code == 200, response.text
+    return [result["id"] for result in response.json()["results"]]
+
+
+@pytest.fixture(scope="session")
+def sales(client, catalog):
+    """30 ventas de dos líneas, repartidas entre tres clientes"""
+    ids = []
+    for number in range(30):
+        lines = [
+            {"liquor_id": catalog[(number + offset) % len(catalog)], "quantity": 1,
+             "unit_price": 10.0, "subtotal": 10.0}
+            for offset in (1, 2)
+        ]
+        response = client("POST", "/ventas/", json={
+            "customer_name": f"Cliente {number % 3}",
+            "customer_id": f"C{number % 3}",
+            "sale_lines": lines,
+            "total": 20.0,
+            "payment_method": "efectivo",
+        })
+        assert response.status_code == 200, response.text
+        ids.append(response.json()["id"])
+    return ids
+
+
+@pytest.fixture
+def statements():
+    """
+    Sentencias SQL (texto y parámetros) ejecutadas durante la prueba
+    """
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append((statement, parameters))
+
+    event.listen(database.engine.sync_engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(database.engine.sync_engine, "before_cursor_execute", record)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# Workers de uvicorn del servidor de prueba
+WORKERS = 4
+
+
+@pytest.fixture
+def server_env() -> dict:
+    """Variables de entorno adicionales del servidor de prueba"""
+    return {}
+
+
+@pytest.fixture
+def server(tmp_path, server_env):
+    """URL de un uvicorn --workers 4 sobre una base SQLite inicializada en tmp_path"""
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{tmp_path / 'workers.db'}",
+        LIQUOR_CACHE_BUS_PATH=str(tmp_path / "cache.gen"),
+        POOL_STATS_PATH=str(tmp_path / "pool.stats"),
+        **server_env
+    )
+    subprocess.run([sys.executable, "-m", "app.database"], cwd=ROOT, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--workers", str(WORKERS), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                httpx.get(f"{url}/diagnostico/pool")
+                break
+            except httpx.TransportError:
+                if time.monotonic() > deadline or process.poll() is not None:
+                    raise RuntimeError("El servidor de prueba no arrancó")
+                time.sleep(0.2)
+        yield url
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
@@ -0,0 +1,37 @@
+# Prueba de la invalidación de la caché de licores entre workers de uvicorn
+# Levanta un servidor real con varios workers sobre una base temporal
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from conftest import WORKERS, liquor_data
+
+
+def read_round(server: str, liquor_id: int, stock: int) -> set:
+    """
+    Lecturas concurrentes del licor y del listado (con conexiones nuevas, así
+    el kernel las reparte entre los workers); retorna los PID que respondieron
+    """
+    def read(_):
+        assert httpx.get(f"{server}/licores/{liquor_id}").json()["stock"] == stock
+        assert httpx.get(f"{server}/licores/").json()[0]["stock"] == stock
+        return httpx.get(f"{server}/diagnostico/pool").json()["pid"]
+
+    with ThreadPoolExecutor(max_workers=2 * WORKERS) as executor:
+        return set(executor.map(read, range(8 * WORKERS)))
+
+
+def test_stock_update_invalidates_every_worker(server):
+    """Tras PUT /inventario/{id}/stock ningún worker sirve el stock anterior de su caché"""
+    liquor_id = httpx.post(f"{server}/licores/", json=liquor_data(1, stock=10)).json()["id"]
+
+    pids = set()
+    for _ in range(20):
+        pids |= read_round(server, liquor_id, 10)
+        if len(pids) == WORKERS:
+            break
+    assert len(pids) == WORKERS
+
+    response = httpx.put(f"{server}/inventario/{liquor_id}/stock", params={"quantity": 5})
+    assert response.json()["stock"] == 15
+
+    for _ in range(3):
+        read_round(server, liquor_id, 15)
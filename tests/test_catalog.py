@@ -0,0 +1,115 @@
+# Pruebas del listado del catálogo de licores
+import csv
+import io
+import json
+from app.cache import liquor_cache
+
+
+def test_listing_revalidation_does_not_query_the_page(client, catalog, statements):
+    """Un If-None-Match vigente responde 304 leyendo solo la versión del catálogo"""
+    etag = client("GET", "/licores/?limit=5").headers["ETag"]
+    # Como tras una escritura en otro worker: la caché de este no tiene la página
+    liquor_cache.invalidate(lambda key: True)
+    statements.clear()
+    response = client("GET", "/licores/?limit=5", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert len(statements) == 1
+    assert "LIMIT" not in statements[0][0]
+
+
+def test_sale_changes_the_listing_etag(client, catalog, sales):
+    """El stock que descuenta una venta cambia el ETag de las páginas del listado"""
+    etag = client("GET", "/licores/?limit=5").headers["ETag"]
+    response = client("POST", "/ventas/", json={
+        "customer_name": "Cliente ETag",
+        "customer_id": None,
+        "sale_lines": [{"liquor_id": catalog[1], "quantity": 1, "unit_price": 10.0, "subtotal": 10.0}],
+        "total": 10.0,
+        "payment_method": "efectivo",
+    })
+    assert response.status_code == 200
+    response = client("GET", "/licores/?limit=5", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def walk_pages(client, query: str, limit: int) -> list:
+    """IDs de todas las páginas de un listado, siguiendo X-Next-Cursor"""
+    ids, cursor = [], None
+    while True:
+        page = f"&cursor={cursor}" if cursor else ""
+        response = client("GET", f"/licores/?{query}&limit={limit}{page}")
+        assert response.status_code == 200, response.text
+        ids.extend(liquor["id"] for liquor in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return ids
+
+
+def test_cursor_pages_cover_the_listing_once(client, catalog):
+    """Las páginas por cursor recorren el listado completo, sin repetir ni saltar filas"""
+    # El catálogo repite el stock (2 y 1000) y el nombre de la marca: claves repetidas
+    for query in ("sort_by=stock", "sort_by=stock&order=desc", "sort_by=name", "order=desc"):
+        full = [liquor["id"] for liquor in client("GET", f"/licores/?{query}&limit=1000").json()]
+        assert walk_pages(client, query, limit=7) == full
+
+
+def test_cursor_from_another_ordering_is_rejected(client, catalog):
+    """Un cursor solo sirve para el sort_by y order con que se generó"""
+    cursor = client("GET", "/licores/?sort_by=updated_at&limit=5").headers["X-Next-Cursor"]
+    for query in ("sort_by=name&", "sort_by=updated_at&order=desc&", ""):
+        response = client("GET", f"/licores/?{query}cursor={cursor}")
+        assert response.status_code == 400
+    response = client("GET", f"/licores/?sort_by=updated_at&cursor={cursor}")
+    assert response.status_code == 200
+
+
+def test_export_matches_the_listing(client, catalog):
+    """/licores/export envía las mismas filas que GET /licores/, en NDJSON o en CSV"""
+    listing = client("GET", "/licores/?category=ron&limit=1000").json()
+    exported = [json.loads(line) for line in client("GET", "/licores/export?category=ron").text.splitlines()]
+    assert exported == listing
+
+    rows = list(csv.reader(io.StringIO(client("GET", "/licores/export?category=ron&format=csv").text)))
+    header, rows = rows[0], [dict(zip(rows[0], row)) for row in rows[1:]]
+    assert set(header) == set(listing[0])
+    assert [(int(row["id"]), int(row["stock"]), row["name"]) for row in rows] == [
+        (liquor["id"], liquor["stock"], liquor["name"]) for liquor in listing
+    ]
+
+    response = client("GET", "/licores/export?category=ron&fields=name,stock&format=csv")
+    assert response.text.splitlines()[0] == "id,name,stock"
+
+
+def test_fields_projects_the_requested_columns(client, catalog, sales, statements):
+    """fields= devuelve solo los campos pedidos (y el ID) y solo lee esas columnas"""
+    liquor_cache.invalidate(lambda key: True)
+    statements.clear()
+    liquors = client("GET", "/licores/?fields=name,price&limit=5").json()
+    assert len(liquors) == 5
+    assert all(set(liquor) == {"id", "name", "price"} for liquor in liquors)
+    [page] = [statement for statement, _ in statements if "LIMIT" in statement]
+    assert "description" not in page
+
+    # Ordenar por una columna no pedida sigue funcionando con cursor
+    response = client("GET", "/licores/?fields=name&sort_by=stock&limit=5")
+    assert set(response.json()[0]) == {"id", "name"}
+    cursor = response.headers["X-Next-Cursor"]
+    assert client("GET", f"/licores/?fields=name&sort_by=stock&limit=5&cursor={cursor}").status_code == 200
+
+    sale = client("GET", "/ventas/?fields=total&limit=1").json()[0]
+    assert set(sale) == {"id", "total"}
+    sale = client("GET", "/ventas/?fields=sale_lines&limit=1").json()[0]
+    assert set(sale) == {"id", "sale_lines"} and len(sale["sale_lines"]) == 2
+
+
+def test_unknown_fields_are_rejected(client, catalog):
+    """Un campo que no existe en la respuesta es un 400, no un campo ignorado"""
+    for url in (
+        "/licores/?fields=name,precio",
+        "/licores/export?fields=nombre",
+        "/ventas/?fields=total,cliente",
+        "/ventas/export?fields=liquor_id",
+    ):
+        response = client("GET", url)
+        assert response.status_code == 400, url
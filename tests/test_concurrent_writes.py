@@ -0,0 +1,61 @@
+# Prueba de escrituras concurrentes de distinto tipo en varios workers sobre SQLite
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+import pytest
+from conftest import liquor_data
+
+ROUNDS = 40
+
+
+@pytest.fixture
+def server_env() -> dict:
+    # Un plazo corto: sin la fila de escritura por worker, las transacciones
+    # que esperan el bloqueo a la vez lo agotan
+    return {"SQLITE_BUSY_TIMEOUT": "3000"}
+
+
+def test_concurrent_mixed_writes_do_not_fail_or_lose_updates(server):
+    """Ventas, ajustes de stock, altas, cambios, bajas y estados a la vez: todo responde 200"""
+    liquor_id = httpx.post(f"{server}/licores/", json=liquor_data(1, stock=1000)).json()["id"]
+    edited_id = httpx.post(f"{server}/licores/", json=liquor_data(2)).json()["id"]
+    sale = {
+        "customer_name": "Cliente",
+        "customer_id": "C",
+        "sale_lines": [{"liquor_id": liquor_id, "quantity": 1, "unit_price": 10.0, "subtotal": 10.0}],
+        "total": 10.0,
+        "payment_method": "efectivo",
+    }
+    sale_id = httpx.post(f"{server}/ventas/", json=sale).json()["id"]
+
+    def sell(_):
+        return [httpx.post(f"{server}/ventas/", json=sale)]
+
+    def restock(_):
+        return [httpx.put(f"{server}/inventario/{liquor_id}/stock", params={"quantity": 2})]
+
+    def edit(number):
+        return [httpx.put(f"{server}/licores/{edited_id}", json={"price": 20.0 + number})]
+
+    def create_and_delete(number):
+        created = httpx.post(f"{server}/licores/", json=liquor_data(100 + number))
+        return [created, httpx.delete(f"{server}/licores/{created.json()['id']}")]
+
+    def change_status(number):
+        status = "pending" if number % 2 else "completed"
+        return [httpx.put(f"{server}/ventas/{sale_id}/status", params={"status": status})]
+
+    writes = [sell, restock, edit, create_and_delete, change_status]
+    with ThreadPoolExecutor(max_workers=32) as executor:
+        responses = [
+            response
+            for result in executor.map(lambda job: job[0](job[1]), [
+                (write, number) for number in range(ROUNDS) for write in writes
+            ])
+            for response in result
+        ]
+
+    failures = [(r.request.method, r.request.url.path, r.status_code, r.text) for r in responses if r.status_code != 200]
+    assert failures == []
+    # 1 venta inicial + ROUNDS ventas de 1 unidad y ROUNDS reposiciones de 2
+    stock = httpx.get(f"{server}/licores/{liquor_id}").json()["stock"]
+    assert stock == 1000 - 1 - ROUNDS + 2 * ROUNDS
@@ -0,0 +1,54 @@
+# Pruebas de los planes de consulta: los filtros y uniones usan sus índices
+import re
+import pytest
+from app import database
+
+
+def query_plans(loop, statements) -> list:
+    """Detalle de EXPLAIN QUERY PLAN de cada SELECT registrado"""
+    async def explain():
+        plans = []
+        async with database.engine.connect() as conn:
+            for statement, parameters in statements:
+                if not statement.lstrip().upper().startswith("SELECT"):
+                    continue
+                rows = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+                plans.extend(row[3] for row in rows)
+        return plans
+    return loop.run_until_complete(explain())
+
+
+@pytest.mark.parametrize("url, index", [
+    ("/licores/?category=ron", "ix_liquors_category_id"),
+    ("/ventas/?customer_id=C1", "ix_sales_customer_id"),
+    ("/ventas/export?from=2000-01-01&to=2100-01-01", "ix_sales_sale_date"),
+    ("/ventas/?limit=10", "ix_sale_lines_sale_id"),
+    ("/inventario/bajo-stock", "ix_liquors_low_stock"),
+])
+def test_query_uses_index(loop, client, sales, statements, url, index):
+    """La consulta del endpoint se resuelve con SEARCH ... USING INDEX"""
+    client("GET", "/ventas/?limit=1")  # Verificación perezosa del esquema
+    statements.clear()
+    response = client("GET", url)
+    assert response.status_code == 200
+    plans = query_plans(loop, list(statements))
+    assert any(re.search(rf"USING (COVERING )?INDEX {index}\b", plan) for plan in plans), plans
+
+
+def test_init_db_drops_superseded_indexes(loop):
+    """La inicialización elimina los índices que otros reemplazaron"""
+    async def index_names():
+        async with database.engine.connect() as conn:
+            rows = await conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'index'")
+            return {row[0] for row in rows}
+
+    async def migrate():
+        async with database.engine.begin() as conn:
+            await conn.exec_driver_sql("CREATE INDEX ix_liquors_category ON liquors (category)")
+            await conn.exec_driver_sql("CREATE INDEX ix_liquors_brand ON liquors (brand)")
+        await database.init_db()
+
+    loop.run_until_complete(migrate())
+    names = loop.run_until_complete(index_names())
+    assert "ix_liquors_category" not in names and "ix_liquors_brand" not in names
+    assert {"ix_liquors_category_id", "ix_liquors_brand_name_volume_ml"} <= names
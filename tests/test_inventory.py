@@ -0,0 +1,21 @@
+# Pruebas de los ajustes de inventario
+from conftest import liquor_data
+
+
+def test_stock_update_cannot_go_negative(client):
+    """Restar más de lo que hay responde 400 y no modifica el stock"""
+    liquor_id = client("POST", "/licores/", json=liquor_data(901, stock=10)).json()["id"]
+    response = client("PUT", f"/inventario/{liquor_id}/stock", params={"quantity": -11})
+    assert response.status_code == 400
+    assert client("GET", f"/licores/{liquor_id}").json()["stock"] == 10
+
+    response = client("PUT", f"/inventario/{liquor_id}/stock", params={"quantity": -10})
+    assert response.status_code == 200
+    assert (response.json()["stock"], response.json()["is_available"]) == (0, False)
+    assert client("GET", "/licores/").status_code == 200
+
+
+def test_stock_update_of_missing_liquor_is_404(client):
+    """Un licor inexistente sigue respondiendo 404, no 400"""
+    response = client("PUT", "/inventario/999999/stock", params={"quantity": 1})
+    assert response.status_code == 404
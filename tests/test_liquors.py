@@ -0,0 +1,77 @@
+# Pruebas de las altas y actualizaciones masivas del catálogo de licores
+import json
+from conftest import liquor_data
+
+
+def upsert_row(number: int, **overrides) -> dict:
+    """Licor del catálogo de un proveedor, con una marca propia de estas pruebas"""
+    return liquor_data(number, brand="Marca Upsert", **overrides)
+
+
+def test_upsert_counts_inserted_updated_and_unchanged(client):
+    """/licores/upsert distingue filas nuevas, cambiadas y sin cambios"""
+    response = client("POST", "/licores/upsert", json=[upsert_row(number) for number in range(3)])
+    assert response.status_code == 200, response.text
+    assert response.json() == {"inserted": 3, "updated": 0, "unchanged": 0, "failed": 0, "errors": []}
+
+    # Mismo catálogo con un precio distinto y un licor nuevo; el stock solo cuenta al insertar
+    rows = [upsert_row(0), upsert_row(1, price=99.0, stock=1), upsert_row(2), upsert_row(3)]
+    response = client("POST", "/licores/upsert", json=rows)
+    assert response.json() == {"inserted": 1, "updated": 1, "unchanged": 2, "failed": 0, "errors": []}
+
+    response = client("POST", "/licores/upsert", json=rows)
+    assert response.json() == {"inserted": 0, "updated": 0, "unchanged": 4, "failed": 0, "errors": []}
+
+    liquors = {
+        liquor["name"]: liquor
+        for liquor in client("GET", "/licores/search?q=Upsert&limit=100").json()
+    }
+    assert liquors["Licor 1"]["price"] == 99.0
+    assert liquors["Licor 1"]["stock"] == 1000
+    assert set(liquors) == {f"Licor {number}" for number in range(4)}
+
+
+def bulk_row(number: int, **overrides) -> dict:
+    return liquor_data(number, brand="Marca Bulk", **overrides)
+
+
+def test_bulk_reports_row_errors_and_returns_ids_in_order(client):
+    """/licores/bulk inserta las filas válidas y reporta cada fila rechazada en su posición"""
+    client("POST", "/licores/", json=bulk_row(0))
+    rows = [
+        bulk_row(1),
+        bulk_row(0),                 # Ya existe en el catálogo
+        bulk_row(2, price=-1),       # Precio inválido
+        bulk_row(3),
+        bulk_row(1, price=50.0),     # Repite la clave de la fila 1
+        bulk_row(4),
+    ]
+    response = client("POST", "/licores/bulk", json=rows)
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert (body["created"], body["failed"]) == (3, 3)
+    results = body["results"]
+    assert [result["index"] for result in results] == list(range(len(rows)))
+    assert [result["status"] for result in results] == ["created", "error", "error", "created", "error", "created"]
+    assert all(result["error"] for result in results if result["status"] == "error")
+
+    # Cada ID corresponde a su fila y se asignan en el orden de la petición
+    ids = [result["id"] for result in results if result["status"] == "created"]
+    assert ids == sorted(ids)
+    for result in results:
+        if result["status"] == "created":
+            liquor = client("GET", f"/licores/{result['id']}").json()
+            assert liquor["name"] == rows[result["index"]]["name"]
+
+
+def test_bulk_accepts_ndjson(client):
+    """El cuerpo NDJSON se procesa igual que el arreglo JSON, con errores por línea"""
+    lines = [json.dumps(bulk_row(10)), "{no es json", json.dumps(bulk_row(11))]
+    response = client(
+        "POST", "/licores/bulk", content="\n".join(lines),
+        headers={"Content-Type": "application/x-ndjson"}
+    )
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert (body["created"], body["failed"]) == (2, 1)
+    assert [result["status"] for result in body["results"]] == ["created", "error", "created"]
@@ -0,0 +1,29 @@
+# Prueba del estado del pool de todos los workers de uvicorn
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from conftest import WORKERS, liquor_data
+
+
+def test_pool_status_covers_every_worker(server):
+    """/diagnostico/pool/workers reúne los contadores que publica cada worker"""
+    liquor_id = httpx.post(f"{server}/licores/", json=liquor_data(1)).json()["id"]
+
+    def read(_):
+        # Conexiones nuevas: el kernel reparte las lecturas entre los workers
+        httpx.get(f"{server}/licores/{liquor_id}")
+        return httpx.get(f"{server}/diagnostico/pool").json()["pid"]
+
+    pids = set()
+    with ThreadPoolExecutor(max_workers=2 * WORKERS) as executor:
+        for _ in range(20):
+            pids |= set(executor.map(read, range(8 * WORKERS)))
+            if len(pids) == WORKERS:
+                break
+    assert len(pids) == WORKERS
+
+    # Cualquier worker responde con los cuatro, no solo consigo mismo
+    for _ in range(2 * WORKERS):
+        workers = httpx.get(f"{server}/diagnostico/pool/workers").json()
+        assert {worker["pid"] for worker in workers} == pids
+        assert all(worker["checkouts"] >= 1 for worker in workers)
+        assert sum(worker["checked_out"] for worker in workers) == 0
@@ -0,0 +1,28 @@
+# Pruebas del registro de consultas lentas
+import logging
+import pytest
+from sqlalchemy.exc import OperationalError
+from app import database
+
+
+def test_select_logs_rows_read(client, sales, caplog, monkeypatch):
+    """Un SELECT se registra con las filas leídas, no con rows=?"""
+    monkeypatch.setattr(database, "SLOW_QUERY_MS", 0)
+    with caplog.at_level(logging.INFO, logger=database.slow_query_logger.name):
+        assert client("GET", "/ventas/?limit=3").status_code == 200
+    messages = [record.getMessage() for record in caplog.records
+                if record.name == database.slow_query_logger.name]
+    sale_query = next(message for message in messages if "FROM sales" in message)
+    assert "rows=3 " in sale_query
+    assert "endpoint=GET /ventas/" in sale_query
+
+
+def test_failed_statement_does_not_leave_a_timer(loop):
+    """Una sentencia que falla no deja su inicio en la conexión"""
+    async def run():
+        async with database.engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                await conn.exec_driver_sql("SELECT * FROM tabla_inexistente")
+            await conn.exec_driver_sql("SELECT 1")
+            return list(conn.sync_connection.info.get("query_start", []))
+    assert loop.run_until_complete(run()) == []
@@ -0,0 +1,101 @@
+# Pruebas de los listados y la creación de ventas
+from conftest import liquor_data
+
+
+def test_sale_listing_query_count_does_not_grow_with_page_size(client, sales, statements):
+    """Las líneas de toda la página se cargan con una sola consulta adicional (sin N + 1)"""
+    client("GET", "/ventas/?limit=1")  # Verificación perezosa del esquema
+    counts = {}
+    for limit in (1, 25):
+        statements.clear()
+        response = client("GET", f"/ventas/?limit={limit}")
+        assert response.status_code == 200
+        assert len(response.json()) == limit
+        assert all(len(sale["sale_lines"]) == 2 for sale in response.json())
+        counts[limit] = len(statements)
+    assert counts[1] == counts[25] == 2
+
+
+def test_customer_sales_load_lines_in_one_query(client, sales, statements):
+    """Las ventas de un cliente y sus líneas: dos consultas en total"""
+    client("GET", "/ventas/?limit=1")
+    statements.clear()
+    response = client("GET", "/ventas/?customer_id=C0")
+    assert response.status_code == 200
+    assert len(response.json()) == 10
+    assert len(statements) == 2
+
+
+def test_sale_without_lines_is_accepted(client, sales):
+    """Una venta sin líneas no toca el inventario ni llega a un CASE vacío"""
+    response = client("POST", "/ventas/", json={
+        "customer_name": "Cliente sin líneas",
+        "customer_id": None,
+        "sale_lines": [],
+        "total": 0.0,
+        "payment_method": "efectivo",
+    })
+    assert response.status_code == 200, response.text
+    assert response.json()["sale_lines"] == []
+
+
+def basket(*lines, customer_id: str = "STOCK") -> dict:
+    """Venta con una línea (liquor_id, cantidad) por elemento"""
+    return {
+        "customer_name": "Cliente stock",
+        "customer_id": customer_id,
+        "sale_lines": [
+            {"liquor_id": liquor_id, "quantity": quantity, "unit_price": 10.0, "subtotal": 10.0 * quantity}
+            for liquor_id, quantity in lines
+        ],
+        "total": 10.0 * sum(quantity for _, quantity in lines),
+        "payment_method": "efectivo",
+    }
+
+
+def new_liquors(client, first: int, stocks: list) -> list:
+    """Licores nuevos con el stock indicado (el del catálogo de prueba lo gastan las ventas)"""
+    return [
+        client("POST", "/licores/", json=liquor_data(first + number, stock=stock)).json()["id"]
+        for number, stock in enumerate(stocks)
+    ]
+
+
+def stock_of(client, liquor_id: int) -> int:
+    return client("GET", f"/licores/{liquor_id}").json()["stock"]
+
+
+def test_repeated_liquor_in_a_basket_is_decremented_once_per_line(client, sales):
+    """Dos líneas del mismo licor descuentan la suma de sus cantidades"""
+    [liquor_id] = new_liquors(client, 300, [10])
+    response = client("POST", "/ventas/", json=basket((liquor_id, 2), (liquor_id, 3)))
+    assert response.status_code == 200, response.text
+    assert stock_of(client, liquor_id) == 5
+
+    # La suma supera el stock aunque cada línea por sí sola no
+    response = client("POST", "/ventas/", json=basket((liquor_id, 3), (liquor_id, 3)))
+    assert response.status_code == 400
+    assert stock_of(client, liquor_id) == 5
+
+
+def test_insufficient_stock_rejects_the_whole_sale(client, sales):
+    """Si un licor no alcanza la venta responde 400 y no descuenta ningún licor"""
+    first, second = new_liquors(client, 310, [10, 1])
+    response = client("POST", "/ventas/", json=basket((first, 2), (second, 2), customer_id="SIN-STOCK"))
+    assert response.status_code == 400
+    assert (stock_of(client, first), stock_of(client, second)) == (10, 1)
+    assert client("GET", "/ventas/?customer_id=SIN-STOCK").json() == []
+
+
+def test_sale_statement_count_does_not_grow_with_basket_size(client, sales, statements):
+    """Stock, venta y líneas se escriben con el mismo número de sentencias para 1 o 20 licores"""
+    liquor_ids = new_liquors(client, 320, [100] * 20)
+    counts = {}
+    for size in (1, 20):
+        statements.clear()
+        response = client("POST", "/ventas/", json=basket(*((liquor_id, 1) for liquor_id in liquor_ids[:size])))
+        assert response.status_code == 200, response.text
+        counts[size] = len(statements)
+    assert counts[1] == counts[20]
+    assert all(stock_of(client, liquor_id) == 99 for liquor_id in liquor_ids[1:])
+    assert stock_of(client, liquor_ids[0]) == 98
@@ -0,0 +1,114 @@
+# Pruebas de la importación masiva de ventas históricas
+import asyncio
+import json
+import pytest
+from conftest import liquor_data
+from app import crud, database, sales_import
+
+
+def sale_record(liquor_id: int, number: int) -> dict:
+    """Venta histórica de una unidad del licor indicado"""
+    return {
+        "customer_name": f"Cliente importado {number}",
+        "customer_id": "IMPORT",
+        "sale_lines": [{"liquor_id": liquor_id, "quantity": 1, "unit_price": 10.0, "subtotal": 10.0}],
+        "total": 10.0,
+        "payment_method": "efectivo",
+        "sale_date": f"2023-01-01T10:00:{number:02d}",
+    }
+
+
+def test_interrupted_import_keeps_sales_and_stock_consistent(loop, client, sales, monkeypatch):
+    """Una importación cortada a mitad deja cada venta confirmada con su stock descontado"""
+    liquor_id = client("POST", "/licores/", json=liquor_data(900, stock=100)).json()["id"]
+    records = [sale_record(liquor_id, number) for number in range(25)]
+    monkeypatch.setattr(sales_import, "IMPORT_CHUNK_SIZE", 10)
+
+    # El worker se cancela en el tercer lote, en medio de su transacción
+    apply_sold_quantities = crud.apply_sold_quantities
+    calls = []
+
+    async def cancel_third_chunk(db, quantities, **kwargs):
+        calls.append(quantities)
+        if len(calls) == 3:
+            raise asyncio.CancelledError()
+        return await apply_sold_quantities(db, quantities, **kwargs)
+
+    async def numbered(items):
+        for number, item in enumerate(items, start=1):
+            yield number, item, None
+
+    async def interrupted_import():
+        async with database.SessionLocal() as db:
+            await sales_import.SaleImporter(db).run(numbered(records))
+
+    monkeypatch.setattr(crud, "apply_sold_quantities", cancel_third_chunk)
+    with pytest.raises(asyncio.CancelledError):
+        loop.run_until_complete(interrupted_import())
+    monkeypatch.setattr(crud, "apply_sold_quantities", apply_sold_quantities)
+
+    def imported_sales():
+        return len(client("GET", "/ventas/?customer_id=IMPORT").json())
+
+    def stock():
+        return client("GET", f"/licores/{liquor_id}").json()["stock"]
+
+    assert imported_sales() == 20
+    assert stock() == 80
+
+    # El mismo archivo completo se importa de nuevo: solo entran las ventas que faltaban
+    body = "\n".join(json.dumps(record) for record in records)
+    headers = {"Content-Type": "application/x-ndjson"}
+    response = client("POST", "/ventas/import", content=body, headers=headers)
+    assert response.status_code == 200, response.text
+    assert (response.json()["sales"], response.json()["skipped"]) == (5, 20)
+    assert imported_sales() == 25
+    assert stock() == 75
+
+    response = client("POST", "/ventas/import", content=body, headers=headers)
+    assert (response.json()["sales"], response.json()["skipped"]) == (0, 25)
+    assert imported_sales() == 25
+    assert stock() == 75
+
+
+def test_exported_sales_import_back_unchanged(client, catalog, sales):
+    """Lo que exporta GET /ventas/export (NDJSON o CSV) es lo que importa /ventas/import"""
+    records = [
+        {
+            "customer_name": f"Cliente exportado {number}",
+            "customer_id": "EXPORT",
+            "sale_lines": [
+                {"liquor_id": catalog[number], "quantity": 1 + number % 3, "unit_price": 10.0, "subtotal": 10.0 * (1 + number % 3)},
+                {"liquor_id": catalog[number + 1], "quantity": 1, "unit_price": 12.5, "subtotal": 12.5},
+            ][:1 + number % 2],
+            "total": 10.0 * (1 + number % 3) + (12.5 if number % 2 else 0),
+            "payment_method": "tarjeta",
+            "sale_date": f"2021-03-{number + 1:02d}T12:00:00",
+            "status": "cancelled" if number == 3 else "completed",
+        }
+        for number in range(6)
+    ]
+    body = "\n".join(json.dumps(record) for record in records)
+    response = client(
+        "POST", "/ventas/import?apply_stock=false", content=body,
+        headers={"Content-Type": "application/x-ndjson"}
+    )
+    assert (response.json()["sales"], response.json()["lines"]) == (6, 9)
+
+    period = "from=2021-03-01&to=2021-04-01"
+    exported = [
+        json.loads(line)
+        for line in client("GET", f"/ventas/export?{period}").text.splitlines()
+    ]
+    assert [{name: sale[name] for name in records[0]} for sale in exported] == records
+
+    # El CSV (una fila por línea de venta) se reconoce como las mismas ventas
+    response = client("GET", f"/ventas/export?{period}&format=csv")
+    assert len(response.text.splitlines()) == 1 + 9
+    response = client(
+        "POST", "/ventas/import?apply_stock=false", content=response.text,
+        headers={"Content-Type": "text/csv"}
+    )
+    assert response.status_code == 200, response.text
+    assert (response.json()["sales"], response.json()["skipped"], response.json()["failed"]) == (0, 6, 0)
+    assert len(client("GET", "/ventas/?customer_id=EXPORT").json()) == 6
@@ -0,0 +1,69 @@
+# Pruebas de la búsqueda, la búsqueda aproximada, el autocompletado y las facetas
+import pytest
+from conftest import liquor_data
+
+SPIRITS = [
+    {"name": "Johnnie Walker Black Label", "brand": "Johnnie Walker", "category": "whiskey",
+     "description": "Whisky escocés de mezcla", "supplier": "Diageo"},
+    {"name": "Johnnie Walker Red Label", "brand": "Johnnie Walker", "category": "whiskey",
+     "description": "Whisky escocés de mezcla", "supplier": "Diageo"},
+    {"name": "Añejo Reserva", "brand": "Cañaveral", "category": "ron",
+     "description": "Ron añejo de caña", "supplier": "Licorera del Caribe"},
+    {"name": "Ron Viejo de Caldas", "brand": "Caldas", "category": "ron",
+     "description": "Ron añejo colombiano", "supplier": "Licorera del Caribe"},
+]
+
+
+@pytest.fixture(scope="session")
+def spirits(client):
+    """Licores con nombres, marcas y descripciones reales (con tildes y eñes)"""
+    response = client("POST", "/licores/bulk", json=[
+        liquor_data(number, **spirit) for number, spirit in enumerate(SPIRITS)
+    ])
+    assert response.status_code == 200, response.text
+    return {spirit["name"]: result["id"] for spirit, result in zip(SPIRITS, response.json()["results"])}
+
+
+def names(response) -> list:
+    assert response.status_code == 200, response.text
+    return [liquor["name"] for liquor in response.json()]
+
+
+def test_search_ignores_accents(client, spirits):
+    """La búsqueda encuentra las palabras con o sin tildes y eñes"""
+    assert set(names(client("GET", "/licores/search?q=anejo"))) == {"Añejo Reserva", "Ron Viejo de Caldas"}
+    assert names(client("GET", "/licores/search?q=Cañaveral")) == ["Añejo Reserva"]
+    assert names(client("GET", "/licores/search?q=canaveral")) == ["Añejo Reserva"]
+    # Todas las palabras deben aparecer; la última admite prefijo
+    assert names(client("GET", "/licores/search?q=walker%20bla")) == ["Johnnie Walker Black Label"]
+
+
+def test_fuzzy_search_tolerates_typos(client, spirits):
+    """La búsqueda aproximada encuentra nombres y marcas mal escritos"""
+    found = names(client("GET", "/licores/fuzzy?q=jonnie%20walker"))
+    assert set(found[:2]) == {"Johnnie Walker Black Label", "Johnnie Walker Red Label"}
+    assert names(client("GET", "/licores/fuzzy?q=jonie%20walker%20blak"))[0] == "Johnnie Walker Black Label"
+    assert names(client("GET", "/licores/fuzzy?q=canaberal"))[0] == "Añejo Reserva"
+
+
+def test_autocomplete_matches_prefixes_without_accents(client, spirits):
+    """El autocompletado sugiere por prefijo del nombre, de la marca o de una palabra"""
+    def suggested(prefix: str) -> set:
+        response = client("GET", f"/licores/autocomplete?prefix={prefix}")
+        assert response.status_code == 200, response.text
+        return {suggestion["name"] for suggestion in response.json()}
+
+    assert suggested("anej") == {"Añejo Reserva"}
+    assert suggested("Cañav") == {"Añejo Reserva"}
+    assert suggested("johnnie w") == {"Johnnie Walker Black Label", "Johnnie Walker Red Label"}
+    assert suggested("red") == {"Johnnie Walker Red Label"}
+
+
+def test_facets_count_search_results(client, spirits):
+    """Las facetas cuentan los resultados de la búsqueda, ignorando el filtro de su propia faceta"""
+    response = client("GET", "/licores/facets?q=anejo&brand=Caldas")
+    assert response.status_code == 200, response.text
+    facets = response.json()
+    assert {value["value"]: value["count"] for value in facets["brand"]} == {"Cañaveral": 1, "Caldas": 1}
+    assert {value["value"]: value["count"] for value in facets["category"]} == {"ron": 1}
+    assert facets["total"] == 1